@@ -4,18 +4,23 @@ Enhanced with: Registration Requests, Multiple File Uploads, Script Folders
 """
 
 import os
+import re
 import time
+import asyncio
 import json
-import smtplib
+import functools
+import hashlib
+import secrets
+import threading
 import io
-import base64
+import binascii
 import zipfile
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict
-from collections import defaultdict
+from typing import Optional, List, Dict, Deque, Union
+from collections import defaultdict, deque
+from urllib.parse import quote
 from contextlib import asynccontextmanager
 
 try:
@@ -24,15 +29,28 @@ try:
 except ImportError:
     pass
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request as FastAPIRequest
+try:
+    import redis
+except ImportError:
+    redis = None
+
+import anyio
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request as FastAPIRequest
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, BigInteger, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker, Session, relationship, joinedload
-from pydantic import BaseModel, EmailStr, ConfigDict, Field, computed_field
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
+from sqlalchemy import create_engine, event, select, insert, update, delete, func, exists, bindparam, text, tuple_, Column, Integer, String, Text, ForeignKey, BigInteger, Boolean, LargeBinary, Index
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import declarative_base, sessionmaker, Session, relationship, deferred, joinedload, selectinload, undefer, make_transient_to_detached
+from pydantic import BaseModel, EmailStr, ConfigDict, Field, TypeAdapter, field_validator, ValidationInfo
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+import jwt
+import orjson
+from cachetools import LRUCache, TTLCache
+import aiosmtplib
 import google.generativeai as genai
 
 logging.basicConfig(
@@ -51,6 +69,9 @@ if SECRET_KEY == DEFAULT_SECRET_KEY:
     logger.warning("SECRET_KEY not set; using insecure default. Set SECRET_KEY env var in production.")
 
 ALGORITHM = "HS256"
+JWT_KEY = SECRET_KEY.encode()
+JWT_ALGORITHMS = (ALGORITHM,)
+JWT_DECODE_OPTIONS = {"require": ["exp", "sub"]}
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 GEMINI_API_KEY = os.getenv("API_KEY")
 ENABLE_AI_ANALYSIS = os.getenv("ENABLE_AI_ANALYSIS", "false").lower() == "true" and bool(GEMINI_API_KEY)
@@ -60,12 +81,18 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_FROM = os.getenv("SMTP_FROM", "noreply@revithub.com")
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+# A session idle this long is probed with NOOP before reuse; servers commonly drop idle clients after a few minutes
+SMTP_IDLE_CHECK_SECONDS = int(os.getenv("SMTP_IDLE_CHECK_SECONDS", "60"))
+# While the server keeps refusing, wait (doubling up to this cap) between messages instead of reconnecting for each one
+SMTP_FAILURE_BACKOFF_MAX_SECONDS = float(os.getenv("SMTP_FAILURE_BACKOFF_MAX_SECONDS", "60"))
+EMAIL_SHUTDOWN_GRACE_SECONDS = float(os.getenv("EMAIL_SHUTDOWN_GRACE_SECONDS", "10"))
 DEFAULT_ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@revithub.com")
 
 DEVELOPER_ROLE = "DEVELOPER"
 EMPLOYEE_ROLE = "EMPLOYEE"
 
-DEMO_DEVELOPER_EMAIL = os.getenv("DEMO_DEVELOPER_EMAIL", "demo@automation-hub-backend.vercel.app")
+DEMO_DEVELOPER_EMAIL = os.getenv("DEMO_DEVELOPER_EMAIL", "demo@automation-hub-backend.vercel.app").strip().lower()
 DEMO_DEVELOPER_PASSWORD = os.getenv("DEMO_DEVELOPER_PASSWORD", "demo1234")
 DEMO_DEVELOPER_NAME = os.getenv("DEMO_DEVELOPER_NAME", "Demo Developer")
 DEMO_DEVELOPER_COMPANY_TITLE = os.getenv("DEMO_DEVELOPER_COMPANY_TITLE", "Demo Developer")
@@ -73,25 +100,75 @@ DEMO_DEVELOPER_COMPANY_TITLE = os.getenv("DEMO_DEVELOPER_COMPANY_TITLE", "Demo D
 MAX_LOGIN_ATTEMPTS = int(os.getenv("MAX_LOGIN_ATTEMPTS", "5"))
 LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "900"))
 
-# Brute-force tracking (per-process)
-failed_login_attempts: Dict[str, List[int]] = defaultdict(list)
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+# argon2id cost, pinned explicitly (OWASP baseline: 19 MiB, 2 passes, 1 lane) rather than left to library defaults.
+# Stored hashes with other parameters are rehashed on the next successful login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "19456"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+FAILED_LOGIN_PURGE_INTERVAL_SECONDS = 300
+
+# Brute-force tracking (per-process, unless REDIS_URL is set): the last MAX_LOGIN_ATTEMPTS failure timestamps per IP
+failed_login_attempts: Dict[str, Deque[int]] = defaultdict(lambda: deque(maxlen=MAX_LOGIN_ATTEMPTS))
+
+# Authentication caches (per-process): token digest -> (email, exp) and email -> user column snapshot
+token_cache: TTLCache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
+user_cache: TTLCache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL_SECONDS)
+auth_cache_lock = threading.Lock()
+
+# Optional shared state: with REDIS_URL set, user snapshots and failed-login counters live in Redis so every worker sees them
+REDIS_URL = os.getenv("REDIS_URL", "")
+redis_client = redis.Redis.from_url(REDIS_URL) if redis is not None and REDIS_URL else None
+
+SCRIPT_TREE_CACHE_BYTES = int(os.getenv("SCRIPT_TREE_CACHE_BYTES", str(128 * 1024 * 1024)))
+# Rough per-node cost on top of the file payloads, so payload-free nodes still count against the budget
+SCRIPT_NODE_CACHE_OVERHEAD_BYTES = 1024
 
-ALLOWED_ORIGINS = [
+# Serialized script tree subtrees (per-process): node id -> (key, response, weight). One entry per node, so a
+# rebuilt node replaces its stale version; weighed by the data URLs its own request embeds.
+script_node_cache: LRUCache = LRUCache(maxsize=SCRIPT_TREE_CACHE_BYTES, getsizeof=lambda entry: entry[2])
+script_node_cache_lock = threading.Lock()
+
+SCRIPT_FOLDER_CACHE_TTL_SECONDS = int(os.getenv("SCRIPT_FOLDER_CACHE_TTL_SECONDS", "60"))
+
+# Root and Unsorted folder ids (per-process), so script tree requests swap the bootstrap SELECTs for primary-key gets
+script_folder_cache: TTLCache = TTLCache(maxsize=2, ttl=SCRIPT_FOLDER_CACHE_TTL_SECONDS)
+script_folder_cache_lock = threading.Lock()
+
+ALLOWED_ORIGINS = frozenset(
     origin.strip() for origin in os.getenv(
         "ALLOWED_ORIGINS",
         "https://automation-hub-1pax.vercel.app,https://revitautomationhub.onrender.com,http://localhost:5173,http://127.0.0.1:5173,http://localhost:4173,http://127.0.0.1:4173"
     ).split(",") if origin.strip()
-]
+)
 if not ALLOWED_ORIGINS:
-    ALLOWED_ORIGINS = [
+    ALLOWED_ORIGINS = frozenset({
         "http://localhost:5173",
         "http://127.0.0.1:5173",
         "http://localhost:4173",
         "http://127.0.0.1:4173",
-    ]
-
+    })
+ALLOWED_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+DEBUG_ORIGIN_REGEX = re.compile(r"http://localhost:\d+")
+# Lets browsers reuse a preflight for this long instead of sending OPTIONS before most API calls (Chromium caps it at 2h)
+CORS_MAX_AGE_SECONDS = int(os.getenv("CORS_MAX_AGE_SECONDS", "7200"))
+MAX_REQUEST_PAGE_SIZE = 500
+# Carries the keyset cursor for the next page of GET /requests when a limit is given
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+GEMINI_MODEL = None
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
+    # Built once; the model object holds no per-request state
+    GEMINI_MODEL = genai.GenerativeModel("gemini-2.0-flash-exp")
+
+# Analyses keyed by a digest of the exact prompt and image attachment ids (attachments are immutable), so re-running
+# /analyze on an unchanged request skips the Gemini call. Shared through Redis when REDIS_URL is set.
+AI_ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("AI_ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+ai_analysis_cache: TTLCache = TTLCache(maxsize=1000, ttl=AI_ANALYSIS_CACHE_TTL_SECONDS)
+ai_analysis_cache_lock = threading.Lock()
 
 # Database Setup
 default_sqlite = "sqlite:///./automationhub.db"
@@ -100,8 +177,66 @@ if not os.getenv("DATABASE_URL") and os.getenv("VERCEL"):
 
 DATABASE_URL = os.getenv("DATABASE_URL", default_sqlite)
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+# Route handlers are sync and run in AnyIO's worker threads; allow as many as the pool can serve
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+DB_POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "3600"))
+# Set when an external pooler (e.g. PgBouncer in transaction mode) already pools server connections
+DB_USE_NULLPOOL = os.getenv("DB_USE_NULLPOOL", "false").lower() == "true"
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "100"))
+# Pooled connections rarely close, so the close-time PRAGMA optimize is backed by a periodic run
+SQLITE_OPTIMIZE_INTERVAL_SECONDS = int(os.getenv("SQLITE_OPTIMIZE_INTERVAL_SECONDS", "900"))
+engine_kwargs = {"connect_args": connect_args, "query_cache_size": 1200, "pool_pre_ping": True}
+if DB_USE_NULLPOOL:
+    engine_kwargs["poolclass"] = NullPool
+elif DATABASE_URL not in ("sqlite://", "sqlite:///:memory:"):
+    # Sized to the threadpool so sync handlers don't queue up waiting for a connection
+    engine_kwargs.update({
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+    })
+engine = create_engine(DATABASE_URL, **engine_kwargs)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - context._query_started) * 1000
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning("db.slow_query", extra={"elapsed_ms": round(elapsed_ms, 1), "statement": statement[:500]})
+
+
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _connection_record):
+        # WAL lets readers proceed while a commit is in flight
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+    @event.listens_for(engine, "close")
+    def _sqlite_optimize(dbapi_connection, _connection_record):
+        # Lets SQLite refresh planner statistics for the tables this connection queried
+        try:
+            dbapi_connection.execute("PRAGMA optimize")
+        except Exception as exc:
+            logger.debug("db.optimize_failed", extra={"error": str(exc)})
+
+# Sessions are request-scoped, so objects can keep their loaded state across commit instead of re-SELECTing it
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
 # Database Models
@@ -112,15 +247,26 @@ class User(Base):
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
-    role = Column(String, nullable=False)
+    role = Column(String, nullable=False, index=True)
     company_title = Column(String, nullable=True)
     avatar = Column(String, nullable=True)
     
+    # Case-insensitive uniqueness even if some write path skips normalize_email; also serves the lower(email) lookups
+    __table_args__ = (Index("ux_users_email_lower", func.lower(email), unique=True),)
+    
     requests = relationship("Request", back_populates="requester", foreign_keys="Request.requester_id")
 
 
 class RegistrationRequest(Base):
     __tablename__ = "registration_requests"
+    __table_args__ = (
+        Index("ix_registration_requests_email_status", "email", "status"),
+        # At most one pending request per email; lets registration insert with ON CONFLICT DO NOTHING
+        Index(
+            "ux_registration_requests_pending_email", "email", unique=True,
+            sqlite_where=text("status = 'PENDING'"), postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, nullable=False)
@@ -135,6 +281,12 @@ class RegistrationRequest(Base):
 
 class Request(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        # Employee request lists: one requester's rows, already in newest-first order
+        Index("ix_requests_requester_created", "requester_id", text("created_at DESC")),
+        # Status-filtered lists and the completed-request sync, newest first
+        Index("ix_requests_status_created", "status", text("created_at DESC")),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, nullable=False)
@@ -145,13 +297,14 @@ class Request(Base):
     revit_version = Column(String, nullable=False)
     requester_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     requester_name = Column(String, nullable=False)
-    created_at = Column(BigInteger, nullable=False)
+    created_at = Column(BigInteger, nullable=False, index=True)
     updated_at = Column(BigInteger, nullable=False)
     due_date = Column(String, nullable=True)
     result_script = Column(Text, nullable=True)
     result_file_name = Column(String, nullable=True)
     ai_analysis = Column(Text, nullable=True)
     developer_notes = Column(Text, nullable=True)
+    submission_count = Column(Integer, nullable=False, default=0)
     
     requester = relationship("User", back_populates="requests", foreign_keys=[requester_id])
     attachments = relationship("Attachment", back_populates="request", cascade="all, delete-orphan")
@@ -160,19 +313,16 @@ class Request(Base):
     submission_events = relationship("SubmissionEvent", back_populates="request", cascade="all, delete-orphan", order_by="SubmissionEvent.created_at")
     comments = relationship("Comment", back_populates="request", cascade="all, delete-orphan", order_by="Comment.created_at")
 
-    @property
-    def submission_count(self) -> int:
-        return len(self.submission_events or [])
-
 
 class Attachment(Base):
     __tablename__ = "attachments"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)
-    data = Column(Text, nullable=False)
+    # Deferred: loaded only by the paths that serve the payload (undefer(...) or an explicit column select)
+    data = deferred(Column(LargeBinary, nullable=False))
     
     request = relationship("Request", back_populates="attachments")
 
@@ -181,10 +331,10 @@ class ResultFile(Base):
     __tablename__ = "result_files"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)
-    data = Column(Text, nullable=False)
+    data = deferred(Column(LargeBinary, nullable=False))
     
     request = relationship("Request", back_populates="result_files")
 
@@ -193,7 +343,7 @@ class SubmissionEvent(Base):
     __tablename__ = "submission_events"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False, index=True)
     event_type = Column(String, nullable=False)  # SUBMISSION | RESUBMISSION
     created_at = Column(BigInteger, nullable=False)
     added_files = Column(Integer, nullable=False, default=0)
@@ -203,6 +353,7 @@ class SubmissionEvent(Base):
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (Index("ix_comments_request_created", "request_id", "created_at"),)
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
@@ -229,6 +380,7 @@ class ScriptFolder(Base):
 
 class ScriptFolderItem(Base):
     __tablename__ = "script_folder_items"
+    __table_args__ = (Index("ix_script_folder_items_folder_request", "folder_id", "request_id", unique=True),)
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     folder_id = Column(Integer, ForeignKey("script_folders.id"), nullable=False)
@@ -240,12 +392,14 @@ class ScriptFolderItem(Base):
 
 class ScriptNode(Base):
     __tablename__ = "script_nodes"
+    # Leading parent_id also serves plain children-of-parent lookups
+    __table_args__ = (Index("ix_script_nodes_parent_name_type", "parent_id", "name", "type"),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)  # FOLDER | FILE
     parent_id = Column(Integer, ForeignKey("script_nodes.id"), nullable=True)
-    request_id = Column(Integer, ForeignKey("requests.id"), nullable=True)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=True, index=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(BigInteger, nullable=False)
     updated_at = Column(BigInteger, nullable=False)
@@ -254,11 +408,119 @@ class ScriptNode(Base):
     request = relationship("Request")
 
 
-Base.metadata.create_all(bind=engine)
+# Bump whenever the models or ensure_schema change, so existing databases pick the change up on next start
+SCHEMA_VERSION = 1
+
+
+BINARY_CHUNK_SIZE = 64 * 1024
+# Result file payloads loaded per query while streaming the library export
+EXPORT_FETCH_BATCH_SIZE = 32
+
+
+def decode_data_url(value: str) -> bytes:
+    """Decode a base64 data URL (or bare base64 string) into raw bytes."""
+    # binascii accepts ASCII str directly, so the payload slice is the only copy made
+    comma = value.find(",")
+    try:
+        return binascii.a2b_base64(value[comma + 1:] if comma >= 0 else value)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid file data")
+
+
+def encode_data_url(data: bytes, mime_type: Optional[str]) -> str:
+    """Encode raw bytes as the data URL shape the frontend expects."""
+    encoded = binascii.b2a_base64(data, newline=False).decode("ascii")
+    return f"data:{mime_type or 'application/octet-stream'};base64,{encoded}"
+
+
+def iter_binary_chunks(data: bytes, chunk_size: int = BINARY_CHUNK_SIZE):
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
 
+# File-backed SQLite can hand out a payload piecewise (incremental BLOB I/O); in-memory databases are per-connection
+SQLITE_BLOB_STREAMING = engine.dialect.name == "sqlite" and DATABASE_URL not in ("sqlite://", "sqlite:///:memory:")
 
-def ensure_schema():
-    """Ensure new columns exist when running against an existing SQLite file."""
+
+def iter_sqlite_blob(table: str, row_id: int, chunk_size: int = BINARY_CHUNK_SIZE):
+    # Runs after the request's session is closed, so it reads through its own pooled connection
+    raw = engine.raw_connection()
+    try:
+        with raw.driver_connection.blobopen(table, "data", row_id, readonly=True) as blob:
+            while chunk := blob.read(chunk_size):
+                yield chunk
+    finally:
+        raw.close()
+
+
+def content_disposition(filename: str) -> str:
+    """Attachment header safe for any stored name: an ASCII fallback plus the RFC 5987 UTF-8 form."""
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in filename)
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+
+def file_download_response(db: Session, model, row) -> StreamingResponse:
+    """Stream an attachment or result file payload without loading it whole where the database allows."""
+    if SQLITE_BLOB_STREAMING:
+        size = db.execute(select(func.length(model.data)).where(model.id == row.id)).scalar_one()
+        body = iter_sqlite_blob(model.__tablename__, row.id)
+    else:
+        data = db.execute(select(model.data).where(model.id == row.id)).scalar_one()
+        size, body = len(data), iter_binary_chunks(data)
+    return StreamingResponse(
+        body,
+        media_type=row.type or "application/octet-stream",
+        headers={
+            "Content-Disposition": content_disposition(row.name),
+            "Content-Length": str(size),
+        }
+    )
+
+
+# Payloads that are already compressed gain nothing from DEFLATE; store them as-is.
+COMPRESSED_SIGNATURES = (
+    b"PK\x03\x04",          # zip / docx / xlsx / nupkg
+    b"\x1f\x8b",            # gzip
+    b"7z\xbc\xaf\x27\x1c",  # 7-Zip
+    b"Rar!",                # rar
+    b"\x89PNG",             # png
+    b"\xff\xd8\xff",        # jpeg
+    b"GIF8",                # gif
+)
+
+
+def zip_compression_for(data: bytes) -> int:
+    if data.startswith(COMPRESSED_SIGNATURES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class ZipStreamSink(io.RawIOBase):
+    """Non-seekable write target that lets zipfile output be drained chunk by chunk."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def ensure_schema() -> bool:
+    """Ensure new columns exist when running against an existing SQLite file.
+
+    Returns False when an index had to be skipped, so the migration is retried on the next start.
+    """
+    complete = True
     with engine.begin() as conn:
         user_columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(users)").fetchall()}
         if "company_title" not in user_columns:
@@ -266,9 +528,112 @@ def ensure_schema():
         reg_columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(registration_requests)").fetchall()}
         if "company_title" not in reg_columns:
             conn.exec_driver_sql("ALTER TABLE registration_requests ADD COLUMN company_title TEXT")
+        request_columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(requests)").fetchall()}
+        if "submission_count" not in request_columns:
+            conn.exec_driver_sql("ALTER TABLE requests ADD COLUMN submission_count INTEGER NOT NULL DEFAULT 0")
+            conn.exec_driver_sql(
+                "UPDATE requests SET submission_count = "
+                "(SELECT COUNT(*) FROM submission_events WHERE submission_events.request_id = requests.id)"
+            )
+        # File payloads used to be stored as base64 data URLs; decode any legacy rows to raw bytes.
+        for table in ("attachments", "result_files"):
+            legacy_ids = [
+                row[0] for row in conn.exec_driver_sql(f"SELECT id FROM {table} WHERE typeof(data) = 'text'").fetchall()
+            ]
+            for row_id in legacy_ids:
+                payload = conn.exec_driver_sql(f"SELECT data FROM {table} WHERE id = ?", (row_id,)).scalar()
+                try:
+                    data = decode_data_url(payload)
+                except HTTPException:
+                    # Already unreadable before the migration; keep its bytes rather than fail startup
+                    data = payload.encode()
+                conn.exec_driver_sql(f"UPDATE {table} SET data = ? WHERE id = ?", (data, row_id))
+            if legacy_ids:
+                logger.info("schema.binary_migrated", extra={"table": table, "rows": len(legacy_ids)})
+        # Older databases could hold duplicate folder memberships; keep the first so the unique index applies
+        conn.exec_driver_sql(
+            "DELETE FROM script_folder_items WHERE id NOT IN "
+            "(SELECT MIN(id) FROM script_folder_items GROUP BY folder_id, request_id)"
+        )
+        # Normalize legacy mixed-case emails before the lower(email) unique index is built
+        conn.exec_driver_sql(
+            "UPDATE users SET email = lower(trim(email)) WHERE email != lower(trim(email)) AND NOT EXISTS "
+            "(SELECT 1 FROM users other WHERE other.id != users.id AND lower(trim(other.email)) = lower(trim(users.email)))"
+        )
+        # Accounts that differ only by case can't be merged safely; leave them for an operator and skip the index
+        email_collisions = conn.exec_driver_sql(
+            "SELECT lower(trim(email)), COUNT(*) FROM users GROUP BY lower(trim(email)) HAVING COUNT(*) > 1"
+        ).fetchall()
+        if email_collisions:
+            complete = False
+            logger.warning(
+                "schema.email_index_skipped",
+                extra={"index": "ux_users_email_lower", "emails": [row[0] for row in email_collisions]},
+            )
+        conn.exec_driver_sql(
+            "UPDATE registration_requests SET status = 'REJECTED' WHERE status = 'PENDING' AND id NOT IN "
+            "(SELECT MIN(id) FROM registration_requests WHERE status = 'PENDING' GROUP BY email)"
+        )
+        # Single-column indexes now covered by a composite index's leading column
+        for superseded in ("ix_requests_status", "ix_comments_request_id"):
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {superseded}")
+        # create_all skips indexes on tables that already exist
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if email_collisions and index.name == "ux_users_email_lower":
+                    continue
+                # IF NOT EXISTS rather than checkfirst: SQLite reflection can't see expression indexes
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        # Gathers statistics for tables whose indexes are new or whose stats have gone stale
+        conn.exec_driver_sql("PRAGMA optimize")
+    return complete
+
+
+def init_database():
+    """Create and migrate the schema once per SCHEMA_VERSION; later starts (and extra workers) read one PRAGMA."""
+    is_sqlite = DATABASE_URL.startswith("sqlite")
+    if is_sqlite:
+        with engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION:
+                return
+    Base.metadata.create_all(bind=engine)
+    if ensure_schema() and is_sqlite:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 
-ensure_schema()
+# Runs at import rather than in lifespan: tests and scripts use the models without starting the app
+init_database()
+
+# Everything RequestListResponse serializes: join the single requester row, batch each collection with one IN query
+REQUEST_LIST_OPTIONS = (
+    joinedload(Request.requester),
+    selectinload(Request.attachments).undefer(Attachment.data),
+    selectinload(Request.result_files).undefer(ResultFile.data),
+    selectinload(Request.comments),
+)
+REQUEST_RESPONSE_OPTIONS = REQUEST_LIST_OPTIONS + (selectinload(Request.submission_events),)
+
+# Fixed-shape hot-path lookups, built once so each call only binds parameters against the compiled cache
+# While legacy case-only duplicates remain (see ensure_schema) the exact match wins, as it did before the index
+USER_BY_EMAIL = (
+    select(User)
+    .where(func.lower(User.email) == bindparam("email"))
+    .order_by(User.email != bindparam("email"), User.id)
+    .limit(1)
+)
+# Existence only: answered from the email index without reading the user row
+EMAIL_REGISTERED = select(exists().where(func.lower(User.email) == bindparam("email")))
+REGISTRATION_PENDING = select(exists().where(
+    RegistrationRequest.email == bindparam("email"), RegistrationRequest.status == "PENDING"
+))
+DEVELOPER_COUNT = select(func.count()).select_from(User).where(User.role == DEVELOPER_ROLE)
+ROOT_SCRIPT_FOLDER = select(ScriptNode).where(ScriptNode.parent_id.is_(None)).limit(1)
+UNSORTED_SCRIPT_FOLDER = select(ScriptNode).where(
+    ScriptNode.parent_id == bindparam("parent_id"),
+    ScriptNode.type == "FOLDER",
+    ScriptNode.name == "Unsorted",
+).limit(1)
 
 # Pydantic Schemas
 class AttachmentCreate(BaseModel):
@@ -285,6 +650,13 @@ class AttachmentResponse(BaseModel):
     type: str
     data: str
 
+    @field_validator("data", mode="before")
+    @classmethod
+    def encode_data(cls, value, info: ValidationInfo):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return encode_data_url(bytes(value), info.data.get("type"))
+        return value
+
 
 class ResultFileResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -294,6 +666,22 @@ class ResultFileResponse(BaseModel):
     type: str
     data: str
 
+    @field_validator("data", mode="before")
+    @classmethod
+    def encode_data(cls, value, info: ValidationInfo):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return encode_data_url(bytes(value), info.data.get("type"))
+        return value
+
+
+# Attachment / result file without its payload, for listings that fetch bytes from the /raw endpoints
+class FileMetaResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    name: str
+    type: str
+
 
 class CommentCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=2000)
@@ -331,7 +719,7 @@ class UserCreate(BaseModel):
 
 
 class UserResponse(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
     
     id: int
     name: str
@@ -394,7 +782,8 @@ class RequestUpdate(BaseModel):
     developer_notes: Optional[str] = Field(None, alias="developerNotes")
 
 
-class RequestResponse(BaseModel):
+# Write endpoints return the summary so a mutation never drags the relationship graph through serialization
+class RequestSummaryResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True, populate_by_name=True)
     
     id: int
@@ -413,15 +802,25 @@ class RequestResponse(BaseModel):
     result_file_name: Optional[str] = Field(None, alias="resultFileName", serialization_alias="resultFileName")
     ai_analysis: Optional[str] = Field(None, alias="aiAnalysis", serialization_alias="aiAnalysis")
     developer_notes: Optional[str] = Field(None, alias="developerNotes", serialization_alias="developerNotes")
+    submission_count: int = Field(0, alias="submissionCount", serialization_alias="submissionCount")
+
+
+class RequestListResponse(RequestSummaryResponse):
     requester: UserResponse
     attachments: List[AttachmentResponse] = []
     result_files: List[ResultFileResponse] = Field([], alias="resultFiles", serialization_alias="resultFiles")
-    submission_events: List[SubmissionEventResponse] = Field([], alias="submissionEvents", serialization_alias="submissionEvents")
     comments: List[CommentResponse] = Field([], alias="comments", serialization_alias="comments")
 
-    @computed_field(return_type=int, alias="submissionCount")
-    def submission_count(self) -> int:
-        return len(self.submission_events or [])
+
+class RequestListItem(RequestSummaryResponse):
+    requester: UserResponse
+    attachments: List[FileMetaResponse] = []
+    result_files: List[FileMetaResponse] = Field([], alias="resultFiles", serialization_alias="resultFiles")
+    comments: List[CommentResponse] = Field([], alias="comments", serialization_alias="comments")
+
+
+class RequestResponse(RequestListResponse):
+    submission_events: List[SubmissionEventResponse] = Field([], alias="submissionEvents", serialization_alias="submissionEvents")
 
 
 class ScriptFolderCreate(BaseModel):
@@ -452,7 +851,7 @@ class ScriptNodeResponse(BaseModel):
     created_at: int = Field(..., alias="createdAt", serialization_alias="createdAt")
     updated_at: int = Field(..., alias="updatedAt", serialization_alias="updatedAt")
     children: List["ScriptNodeResponse"] = []
-    request: Optional[RequestResponse] = None
+    request: Optional[RequestListResponse] = None
 
 
 class ScriptFolderNodeCreate(BaseModel):
@@ -490,28 +889,181 @@ class EmailNotification(BaseModel):
 
 ScriptNodeResponse.model_rebuild()
 
+request_list_adapter = TypeAdapter(List[RequestListResponse])
+request_list_item_adapter = TypeAdapter(List[RequestListItem])
+user_list_adapter = TypeAdapter(List[UserResponse])
+registration_list_adapter = TypeAdapter(List[RegistrationRequestResponse])
+folder_list_adapter = TypeAdapter(List[ScriptFolderResponse])
+comment_list_adapter = TypeAdapter(List[CommentResponse])
+script_tree_adapter = TypeAdapter(List[ScriptNodeResponse])
+
+
+# Rows from our own database are trusted, so responses are built with model_construct and never validated
+def construct_from(model, obj):
+    return model.model_construct(**{name: getattr(obj, name) for name in model.model_fields})
+
+
+def construct_file(model, file_row):
+    return model.model_construct(
+        id=file_row.id, name=file_row.name, type=file_row.type, data=encode_data_url(file_row.data, file_row.type)
+    )
+
+
+def build_request_response(req: Request, model=RequestListResponse):
+    values = {name: getattr(req, name) for name in RequestSummaryResponse.model_fields}
+    values.update(
+        requester=construct_from(UserResponse, req.requester),
+        attachments=[construct_file(AttachmentResponse, attachment) for attachment in req.attachments],
+        result_files=[construct_file(ResultFileResponse, result_file) for result_file in req.result_files],
+        comments=[construct_from(CommentResponse, comment) for comment in req.comments],
+    )
+    if model is RequestResponse:
+        values["submission_events"] = [construct_from(SubmissionEventResponse, e) for e in req.submission_events]
+    return model.model_construct(**values)
+
+
+def fetch_request_list(db: Session, criteria: list, include_data: bool = True, limit: Optional[int] = None) -> list:
+    """Newest-first request listing read as plain Core rows: one query per table, no ORM instances."""
+    request_columns = [Request.__table__.c[name] for name in RequestSummaryResponse.model_fields]
+    # id breaks created_at ties so keyset pages never skip or repeat a row
+    newest_first = (Request.created_at.desc(), Request.id.desc())
+    rows = db.execute(
+        select(*request_columns).where(*criteria).order_by(*newest_first).limit(limit)
+    ).mappings().all()
+    if not rows:
+        return []
+    # Child tables are matched with the same criteria as a subquery instead of binding every request id
+    listed = select(Request.id).where(*criteria)
+    if limit is not None:
+        listed = listed.order_by(*newest_first).limit(limit)
+    listed_ids = listed.scalar_subquery()
+
+    user_columns = [User.__table__.c[name] for name in UserResponse.model_fields]
+    requesters = {
+        row["id"]: UserResponse.model_construct(**row)
+        for row in db.execute(
+            select(*user_columns).where(User.id.in_(select(Request.requester_id).where(Request.id.in_(listed_ids))))
+        ).mappings()
+    }
+
+    def files_by_request(model, file_model) -> Dict[int, list]:
+        columns = [model.id, model.request_id, model.name, model.type] + ([model.data] if include_data else [])
+        grouped: Dict[int, list] = defaultdict(list)
+        for row in db.execute(select(*columns).where(model.request_id.in_(listed_ids)).order_by(model.id)):
+            if include_data:
+                item = file_model.model_construct(
+                    id=row.id, name=row.name, type=row.type, data=encode_data_url(row.data, row.type)
+                )
+            else:
+                item = FileMetaResponse.model_construct(id=row.id, name=row.name, type=row.type)
+            grouped[row.request_id].append(item)
+        return grouped
+
+    attachments = files_by_request(Attachment, AttachmentResponse)
+    result_files = files_by_request(ResultFile, ResultFileResponse)
+    comment_columns = [Comment.__table__.c[name] for name in CommentResponse.model_fields]
+    comments: Dict[int, list] = defaultdict(list)
+    for row in db.execute(
+        select(*comment_columns).where(Comment.request_id.in_(listed_ids)).order_by(Comment.created_at, Comment.id)
+    ).mappings():
+        comments[row["request_id"]].append(CommentResponse.model_construct(**row))
+
+    model = RequestListResponse if include_data else RequestListItem
+    return [
+        model.model_construct(
+            **row,
+            requester=requesters.get(row["requester_id"]),
+            attachments=attachments.get(row["id"], []),
+            result_files=result_files.get(row["id"], []),
+            comments=comments.get(row["id"], []),
+        )
+        for row in rows
+    ]
+
+
+# Serialized straight to JSON bytes by pydantic-core, skipping FastAPI's response_model pass and the
+# intermediate dicts an ORJSONResponse would need
+def model_response(item: BaseModel, status_code: int = 200) -> Response:
+    return Response(item.model_dump_json(by_alias=True), status_code=status_code, media_type="application/json")
+
+
+def list_response(adapter: TypeAdapter, items) -> Response:
+    return Response(adapter.dump_json(items, by_alias=True), media_type="application/json")
+
+
+def conditional_response(request: FastAPIRequest, response: Response) -> Response:
+    """Tag a body with a content hash and answer 304 when the client already holds that version.
+
+    This only saves bandwidth: the queries and serialization behind the body still run on every request.
+    """
+    # Hashing the bytes can't go stale the way a max(updated_at) tag would on comments, deletes or profile edits
+    etag = f'"{hashlib.blake2b(response.body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    presented = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in presented.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return response
+
 
 # Authentication
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_KIB,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Each argon2 hash takes ARGON2_MEMORY_KIB of memory and a core per lane; cap how many of the handler threads may hash at once
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(os.cpu_count() or 2)))
+password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+
+# Checked against when the email is unknown, so a missing user costs the same hash as a wrong password.
+# Built on first use rather than at import so worker start-up doesn't pay for an argon2 hash.
+@functools.lru_cache(maxsize=None)
+def dummy_password_hash() -> str:
+    return pwd_context.hash(secrets.token_urlsafe(16))
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with password_hash_slots:
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with password_hash_slots:
+        return pwd_context.hash(password)
+
+
+PASSWORD_HAS_UPPER, PASSWORD_HAS_LOWER, PASSWORD_HAS_DIGIT = 1, 2, 4
+PASSWORD_HAS_ALL = PASSWORD_HAS_UPPER | PASSWORD_HAS_LOWER | PASSWORD_HAS_DIGIT
 
 
 def enforce_password_policy(password: str):
     if len(password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
-    if not any(c.isupper() for c in password):
+    # Single pass over the password, stopping as soon as every character class has been seen
+    flags = 0
+    for c in password:
+        if c.isupper():
+            flags |= PASSWORD_HAS_UPPER
+        elif c.islower():
+            flags |= PASSWORD_HAS_LOWER
+        elif c.isdigit():
+            flags |= PASSWORD_HAS_DIGIT
+        else:
+            continue
+        if flags == PASSWORD_HAS_ALL:
+            return
+    if not flags & PASSWORD_HAS_UPPER:
         raise HTTPException(status_code=400, detail="Password must include at least one uppercase letter")
-    if not any(c.islower() for c in password):
+    if not flags & PASSWORD_HAS_LOWER:
         raise HTTPException(status_code=400, detail="Password must include at least one lowercase letter")
-    if not any(c.isdigit() for c in password):
+    if not flags & PASSWORD_HAS_DIGIT:
         raise HTTPException(status_code=400, detail="Password must include at least one digit")
 
 
@@ -524,26 +1076,24 @@ VALID_ROLES = {DEVELOPER_ROLE, EMPLOYEE_ROLE}
 
 def normalize_roles(db: Session):
     """Upgrade legacy role names and hydrate missing metadata."""
-    changed = False
-    legacy_users = db.query(User).filter(User.role == "ARCHITECT").all()
-    for user in legacy_users:
-        user.role = EMPLOYEE_ROLE
-        changed = True
-    invalid_roles = db.query(User).filter(~User.role.in_(list(VALID_ROLES))).all()
-    for user in invalid_roles:
-        user.role = EMPLOYEE_ROLE
-        changed = True
-    if changed:
+    # Legacy ARCHITECT users fall outside VALID_ROLES too, so one UPDATE covers both cases
+    result = db.execute(
+        update(User)
+        .where(~User.role.in_(list(VALID_ROLES)))
+        .values(role=EMPLOYEE_ROLE)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
         db.commit()
 
 
 def ensure_demo_developer(db: Session):
     """Ensure there is always at least one developer account."""
-    developer_count = db.query(User).filter(User.role == DEVELOPER_ROLE).count()
+    developer_count = get_developer_count(db)
     if developer_count > 0:
         return None
 
-    existing = db.query(User).filter(User.email == DEMO_DEVELOPER_EMAIL).first()
+    existing = db.execute(USER_BY_EMAIL, {"email": DEMO_DEVELOPER_EMAIL}).scalar_one_or_none()
     hashed_password = get_password_hash(DEMO_DEVELOPER_PASSWORD)
     avatar_seed = DEMO_DEVELOPER_NAME.lower().replace(" ", "-")
     avatar_url = f"https://api.dicebear.com/7.x/avataaars/svg?seed={avatar_seed}"
@@ -555,7 +1105,6 @@ def ensure_demo_developer(db: Session):
         existing.name = DEMO_DEVELOPER_NAME
         existing.avatar = existing.avatar or avatar_url
         db.commit()
-        db.refresh(existing)
         return existing
 
     demo_user = User(
@@ -568,41 +1117,106 @@ def ensure_demo_developer(db: Session):
     )
     db.add(demo_user)
     db.commit()
-    db.refresh(demo_user)
     return demo_user
 
 
 def get_developer_count(db: Session) -> int:
-    return db.query(User).filter(User.role == DEVELOPER_ROLE).count()
+    return db.execute(DEVELOPER_COUNT).scalar_one()
 
 
 def record_failed_login(ip: str) -> int:
-    now = int(time.time())
-    attempts = [ts for ts in failed_login_attempts.get(ip, []) if now - ts < LOGIN_WINDOW_SECONDS]
-    attempts.append(now)
-    failed_login_attempts[ip] = attempts
+    if redis_client is not None:
+        # INCR + EXPIRE keeps the counter atomic across workers and lets Redis drop idle IPs
+        key = f"login:fail:{ip}"
+        try:
+            pipe = redis_client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, LOGIN_WINDOW_SECONDS)
+            count, _ = pipe.execute()
+            return count
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+    attempts = failed_login_attempts[ip]
+    attempts.append(int(time.time()))
     return len(attempts)
 
 
 def is_ip_blocked(ip: str) -> bool:
-    now = int(time.time())
-    attempts = [ts for ts in failed_login_attempts.get(ip, []) if now - ts < LOGIN_WINDOW_SECONDS]
-    failed_login_attempts[ip] = attempts
-    return len(attempts) >= MAX_LOGIN_ATTEMPTS
+    if redis_client is not None:
+        try:
+            count = redis_client.get(f"login:fail:{ip}")
+            return count is not None and int(count) >= MAX_LOGIN_ATTEMPTS
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+    attempts = failed_login_attempts.get(ip)
+    # The buffer only keeps the newest attempts, so the window check needs just the oldest one
+    return (
+        bool(attempts)
+        and len(attempts) == MAX_LOGIN_ATTEMPTS
+        and int(time.time()) - attempts[0] < LOGIN_WINDOW_SECONDS
+    )
 
 
 def reset_failed_logins(ip: str):
     failed_login_attempts.pop(ip, None)
+    if redis_client is not None:
+        try:
+            redis_client.delete(f"login:fail:{ip}")
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+
+
+def purge_stale_failed_logins() -> int:
+    cutoff = int(time.time()) - LOGIN_WINDOW_SECONDS
+    stale = [ip for ip, attempts in list(failed_login_attempts.items()) if not attempts or attempts[-1] <= cutoff]
+    for ip in stale:
+        failed_login_attempts.pop(ip, None)
+    return len(stale)
+
 
+async def purge_failed_logins_periodically():
+    while True:
+        await asyncio.sleep(FAILED_LOGIN_PURGE_INTERVAL_SECONDS)
+        purged = purge_stale_failed_logins()
+        if purged:
+            logger.info("login.tracker_purged", extra={"ips": purged})
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+
+def optimize_sqlite() -> None:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+
+
+async def optimize_sqlite_periodically():
+    while True:
+        await asyncio.sleep(SQLITE_OPTIMIZE_INTERVAL_SECONDS)
+        try:
+            await anyio.to_thread.run_sync(optimize_sqlite)
+        except Exception as exc:
+            logger.warning("db.optimize_failed", extra={"error": str(exc)})
+
+
+def current_time_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def insert_or_ignore(db: Session, model, index_elements: List[str], index_where=None, **values) -> Optional[int]:
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING id; None means the row already existed."""
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = (
+        dialect_insert(model)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=index_elements, index_where=index_where)
+        .returning(model.id)
+    )
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def create_access_token(data: dict, expires_seconds: int = 15 * 60):
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # NumericDate straight from the clock; no datetime objects on the login path
+    to_encode.update({"exp": int(time.time()) + expires_seconds})
+    encoded_jwt = jwt.encode(to_encode, JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -616,27 +1230,99 @@ def get_db():
 
 def authenticate_user(db: Session, email: str, password: str):
     normalized_email = normalize_email(email)
-    user = db.query(User).filter(User.email == normalized_email).first()
-    if not user or not verify_password(password, user.password):
+    user = db.execute(USER_BY_EMAIL, {"email": normalized_email}).scalar_one_or_none()
+    if user is None:
+        verify_password(password, dummy_password_hash())
         return False
+    # Every attempt pays the full hash cost, so known, unknown and wrong-password logins take the same time
+    if not verify_password(password, user.password):
+        return False
+    # Transparently upgrade legacy bcrypt hashes to argon2id on successful login
+    if pwd_context.needs_update(user.password):
+        user.password = get_password_hash(password)
+        db.commit()
+        invalidate_cached_user(user.email)
+        logger.info("auth.password_rehashed", extra={"user_id": user.id})
+    return user
+
+
+def _decode_token(token: str) -> Optional[str]:
+    """Return the token subject, skipping signature verification for recently seen tokens."""
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with auth_cache_lock:
+        cached = token_cache.get(key)
+    if cached and cached[1] > time.time():
+        return cached[0]
+    payload = jwt.decode(token, JWT_KEY, algorithms=JWT_ALGORITHMS, options=JWT_DECODE_OPTIONS)
+    email = payload.get("sub")
+    if email is not None:
+        with auth_cache_lock:
+            token_cache[key] = (email, payload.get("exp", 0))
+    return email
+
+
+def _get_user_snapshot(email: str) -> Optional[dict]:
+    if redis_client is not None:
+        try:
+            raw = redis_client.get(f"auth:user:{email}")
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+            return None
+        return json.loads(raw) if raw else None
+    with auth_cache_lock:
+        return user_cache.get(email)
+
+
+def _store_user_snapshot(email: str, snapshot: dict):
+    if redis_client is not None:
+        try:
+            redis_client.setex(f"auth:user:{email}", AUTH_CACHE_TTL_SECONDS, json.dumps(snapshot))
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+        return
+    with auth_cache_lock:
+        user_cache[email] = snapshot
+
+
+def _load_user_cached(db: Session, email: str) -> Optional[User]:
+    snapshot = _get_user_snapshot(email)
+    if snapshot is None:
+        user = db.execute(USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
+        if user is None:
+            return None
+        _store_user_snapshot(email, {column: getattr(user, column) for column in User.__table__.columns.keys()})
+        return user
+    # Handlers only read the caller's columns, so a detached instance is enough; merging it into the
+    # session would cost more than building it
+    user = User(**snapshot)
+    make_transient_to_detached(user)
     return user
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def invalidate_cached_user(email: str):
+    with auth_cache_lock:
+        user_cache.pop(email, None)
+    if redis_client is not None:
+        try:
+            redis_client.delete(f"auth:user:{email}")
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
+        email = _decode_token(token)
         if email is None:
             raise credentials_exception
-    except JWTError:
+    except jwt.PyJWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    user = _load_user_cached(db, email)
     if user is None:
         raise credentials_exception
     return user
@@ -651,10 +1337,38 @@ def require_developer(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-def ensure_root_script_folder(db: Session, current_user: Optional[User] = None) -> ScriptNode:
-    root = db.query(ScriptNode).filter(ScriptNode.parent_id.is_(None)).first()
+def _cached_script_folder(db: Session, key: str) -> Optional[ScriptNode]:
+    with script_folder_cache_lock:
+        cached = script_folder_cache.get(key)
+    if cached is None:
+        return None
+    node_id, parent_id = cached
+    # Re-read by primary key: another worker may have deleted the folder, and its id could since have been reused
+    node = db.get(ScriptNode, node_id)
+    if node is None or node.type != "FOLDER" or node.parent_id != parent_id:
+        with script_folder_cache_lock:
+            script_folder_cache.pop(key, None)
+        return None
+    return node
+
+
+def _remember_script_folder(key: str, node: ScriptNode):
+    with script_folder_cache_lock:
+        script_folder_cache[key] = (node.id, node.parent_id)
+
+
+def invalidate_script_folder_cache():
+    with script_folder_cache_lock:
+        script_folder_cache.clear()
+
+
+def ensure_root_script_folder(db: Session, current_user: Optional[User] = None, now: Optional[int] = None) -> ScriptNode:
+    root = _cached_script_folder(db, "root")
+    if root is not None:
+        return root
+    root = db.execute(ROOT_SCRIPT_FOLDER).scalar_one_or_none()
     if not root:
-        now = int(time.time() * 1000)
+        now = now or current_time_ms()
         root = ScriptNode(
             name="Scripts",
             type="FOLDER",
@@ -666,18 +1380,19 @@ def ensure_root_script_folder(db: Session, current_user: Optional[User] = None)
         )
         db.add(root)
         db.commit()
-        db.refresh(root)
+    _remember_script_folder("root", root)
     return root
 
 
-def ensure_unsorted_script_folder(db: Session, root: ScriptNode, current_user: Optional[User] = None) -> ScriptNode:
-    unsorted = db.query(ScriptNode).filter(
-        ScriptNode.parent_id == root.id,
-        ScriptNode.type == "FOLDER",
-        ScriptNode.name == "Unsorted"
-    ).first()
+def ensure_unsorted_script_folder(
+    db: Session, root: ScriptNode, current_user: Optional[User] = None, now: Optional[int] = None
+) -> ScriptNode:
+    unsorted = _cached_script_folder(db, "unsorted")
+    if unsorted is not None:
+        return unsorted
+    unsorted = db.execute(UNSORTED_SCRIPT_FOLDER, {"parent_id": root.id}).scalar_one_or_none()
     if not unsorted:
-        now = int(time.time() * 1000)
+        now = now or current_time_ms()
         unsorted = ScriptNode(
             name="Unsorted",
             type="FOLDER",
@@ -689,71 +1404,163 @@ def ensure_unsorted_script_folder(db: Session, root: ScriptNode, current_user: O
         )
         db.add(unsorted)
         db.commit()
-        db.refresh(unsorted)
+    _remember_script_folder("unsorted", unsorted)
     return unsorted
 
 
-def sync_completed_requests_into_tree(db: Session, created_by: Optional[User], root: ScriptNode):
-    unsorted = ensure_unsorted_script_folder(db, root, created_by)
-    completed_requests = db.query(Request).options(joinedload(Request.result_files)).filter(Request.status == "COMPLETED").all()
-    now = int(time.time() * 1000)
-
+def sync_completed_requests_into_tree(
+    db: Session, created_by: Optional[User], root: ScriptNode, now: Optional[int] = None
+):
+    # One timestamp for every node created in this pass
+    now = now or current_time_ms()
+    unsorted = ensure_unsorted_script_folder(db, root, created_by, now)
+    completed_requests = db.query(Request).options(
+        selectinload(Request.result_files)
+    ).filter(Request.status == "COMPLETED").all()
+    if not completed_requests:
+        return
+    creator_id = created_by.id if created_by else 0
+
+    # Load every request folder and its FILE children up front instead of querying per request
+    folders_by_request: Dict[int, ScriptNode] = {}
+    for folder in db.query(ScriptNode).filter(
+        ScriptNode.type == "FOLDER",
+        ScriptNode.request_id.in_([req.id for req in completed_requests])
+    ).all():
+        folders_by_request.setdefault(folder.request_id, folder)
+
+    existing_files: Dict[int, Dict[str, Optional[ScriptNode]]] = defaultdict(dict)
+    if folders_by_request:
+        for node in db.query(ScriptNode).filter(
+            ScriptNode.parent_id.in_([folder.id for folder in folders_by_request.values()]),
+            ScriptNode.type == "FILE"
+        ).all():
+            existing_files[node.parent_id][node.name] = node
+
+    # The self-referential mapper makes the unit of work insert nodes one row at a time, so new nodes go
+    # through a bulk INSERT ... RETURNING instead
+    new_folders: List[dict] = []
     for req in completed_requests:
-        # Ensure a folder exists for this request
-        folder = db.query(ScriptNode).filter(
-            ScriptNode.type == "FOLDER",
-            ScriptNode.request_id == req.id
-        ).first()
+        folder = folders_by_request.get(req.id)
         if not folder:
-            folder = ScriptNode(
-                name=req.title,
-                type="FOLDER",
-                parent_id=unsorted.id,
-                request_id=req.id,
-                created_by=created_by.id if created_by else 0,
-                created_at=now,
-                updated_at=now
-            )
-            db.add(folder)
-            db.commit()
-            db.refresh(folder)
+            new_folders.append({
+                "name": req.title,
+                "type": "FOLDER",
+                "parent_id": unsorted.id,
+                "request_id": req.id,
+                "created_by": creator_id,
+                "created_at": now,
+                "updated_at": now,
+            })
         # Keep folder under root hierarchy
-        if folder.parent_id is None:
+        elif folder.parent_id is None:
             folder.parent_id = unsorted.id
             folder.updated_at = now
-            db.commit()
 
-        existing_files = {
-            node.name: node for node in db.query(ScriptNode).filter(
-                ScriptNode.parent_id == folder.id,
-                ScriptNode.type == "FILE"
-            ).all()
-        }
+    if new_folders:
+        # Matched back by request_id, so the RETURNING rows may come back in any order
+        for folder in db.scalars(insert(ScriptNode).returning(ScriptNode), new_folders).all():
+            folders_by_request[folder.request_id] = folder
+
+    new_files: List[dict] = []
+    for req in completed_requests:
+        folder = folders_by_request[req.id]
+        folder_files = existing_files[folder.id]
         for rf in req.result_files or []:
-            if rf.name not in existing_files:
-                new_file = ScriptNode(
-                    name=rf.name,
-                    type="FILE",
-                    parent_id=folder.id,
-                    request_id=req.id,
-                    created_by=created_by.id if created_by else 0,
-                    created_at=now,
-                    updated_at=now
-                )
-                db.add(new_file)
-        db.commit()
+            if rf.name not in folder_files:
+                folder_files[rf.name] = None
+                new_files.append({
+                    "name": rf.name,
+                    "type": "FILE",
+                    "parent_id": folder.id,
+                    "request_id": req.id,
+                    "created_by": creator_id,
+                    "created_at": now,
+                    "updated_at": now,
+                })
 
+    if new_files:
+        db.execute(insert(ScriptNode), new_files)
+    db.commit()
 
-def build_script_tree(nodes: List[ScriptNode]) -> List[ScriptNodeResponse]:
+
+def build_script_tree(db: Session, nodes: List[ScriptNode]) -> List[ScriptNodeResponse]:
     children_map: Dict[Optional[int], List[ScriptNode]] = defaultdict(list)
+    # Folders first, then case-insensitive name; built once per node and looked up from C during the sort
+    sort_keys: Dict[ScriptNode, tuple] = {}
     for node in nodes:
         children_map[node.parent_id].append(node)
+        sort_keys[node] = (0 if node.type == "FOLDER" else 1, node.name.lower())
 
     for child_list in children_map.values():
-        child_list.sort(key=lambda n: (0 if n.type == "FOLDER" else 1, n.name.lower()))
+        child_list.sort(key=sort_keys.__getitem__)
+
+    # Cache keys come from summary columns only; payloads are read just for the requests of nodes that miss.
+    # Comments and the requester's profile show up in the response without bumping request.updated_at.
+    linked_ids = select(ScriptNode.request_id).where(ScriptNode.request_id.is_not(None))
+    comment_stats = {
+        row.request_id: (row.count, row.last_id)
+        for row in db.execute(
+            select(Comment.request_id, func.count().label("count"), func.max(Comment.id).label("last_id"))
+            .where(Comment.request_id.in_(linked_ids))
+            .group_by(Comment.request_id)
+        )
+    }
+    request_keys = {
+        row.id: (
+            row.id, row.updated_at, comment_stats.get(row.id),
+            row.role, row.name, row.email, row.company_title, row.avatar
+        )
+        for row in db.execute(
+            select(
+                Request.id, Request.updated_at,
+                User.role, User.name, User.email, User.company_title, User.avatar
+            )
+            .join(User, User.id == Request.requester_id)
+            .where(Request.id.in_(linked_ids))
+        )
+    }
+
+    roots = children_map.get(None, [])
+    cache_keys: Dict[int, tuple] = {}
+
+    def compute_key(node: ScriptNode) -> tuple:
+        # The children's keys themselves rather than their hashes, so a collision can't serve the wrong subtree
+        child_keys = tuple(compute_key(child) for child in children_map.get(node.id, []))
+        key = (
+            node.id, node.name, node.type, node.parent_id, node.request_id,
+            node.created_at, node.updated_at, request_keys.get(node.request_id), child_keys
+        )
+        cache_keys[node.id] = key
+        return key
+
+    for root in roots:
+        compute_key(root)
+
+    # A hit needs the stored key tuple to equal the fresh one, so any change at or below a node rebuilds it
+    cached: Dict[int, Optional[ScriptNodeResponse]] = {}
+    with script_node_cache_lock:
+        for node_id, key in cache_keys.items():
+            entry = script_node_cache.get(node_id)
+            cached[node_id] = entry[1] if entry is not None and entry[0] == key else None
+
+    # Build each linked request of an uncached node once, even if several nodes point at it
+    missed_request_ids = {
+        node.request_id
+        for node in nodes
+        if node.request_id in request_keys and node.id in cache_keys and cached[node.id] is None
+    }
+    built_requests = {}
+    if missed_request_ids:
+        built_requests = {
+            item.id: item for item in fetch_request_list(db, [Request.id.in_(missed_request_ids)])
+        }
 
     def serialize(node: ScriptNode) -> ScriptNodeResponse:
-        return ScriptNodeResponse(
+        hit = cached[node.id]
+        if hit is not None:
+            return hit
+        response = ScriptNodeResponse.model_construct(
             id=node.id,
             name=node.name,
             type=node.type,
@@ -762,22 +1569,100 @@ def build_script_tree(nodes: List[ScriptNode]) -> List[ScriptNodeResponse]:
             created_at=node.created_at,
             updated_at=node.updated_at,
             children=[serialize(child) for child in children_map.get(node.id, [])],
-            request=RequestResponse.model_validate(node.request) if node.request else None
+            request=built_requests.get(node.request_id)
         )
-
-    return [serialize(node) for node in children_map.get(None, [])]
+        weight = SCRIPT_NODE_CACHE_OVERHEAD_BYTES
+        if response.request is not None:
+            files = response.request.attachments + response.request.result_files
+            weight += sum(len(item.data) for item in files) + len(response.request.requester.avatar or "")
+        with script_node_cache_lock:
+            if weight <= script_node_cache.maxsize:
+                script_node_cache[node.id] = (cache_keys[node.id], response, weight)
+            else:
+                script_node_cache.pop(node.id, None)
+        return response
+
+    return [serialize(node) for node in roots]
+
+
+def script_subtree(start):
+    """Recursive CTE of the ids of the nodes matched by `start` and every node below them."""
+    subtree = select(ScriptNode.id).where(start).cte("subtree", recursive=True)
+    return subtree.union_all(select(ScriptNode.id).join(subtree, ScriptNode.parent_id == subtree.c.id))
+
+
+def script_ancestors(node_id: int):
+    """Recursive CTE of the ids on the path from `node_id` up to the root, the node itself included."""
+    ancestors = select(ScriptNode.id, ScriptNode.parent_id).where(ScriptNode.id == node_id).cte(
+        "ancestors", recursive=True
+    )
+    return ancestors.union_all(
+        select(ScriptNode.id, ScriptNode.parent_id).join(ancestors, ScriptNode.id == ancestors.c.parent_id)
+    )
 
 
 def get_folder_or_404(db: Session, folder_id: int) -> ScriptNode:
-    folder = db.query(ScriptNode).filter(ScriptNode.id == folder_id, ScriptNode.type == "FOLDER").first()
-    if not folder:
+    folder = db.get(ScriptNode, folder_id)
+    if not folder or folder.type != "FOLDER":
         raise HTTPException(status_code=404, detail="Folder not found")
     return folder
 
 
 # FastAPI App
+email_queue: Optional[asyncio.Queue] = None
+
+
+async def _connect_smtp() -> aiosmtplib.SMTP:
+    client = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, start_tls=True)
+    await client.connect()
+    await client.login(SMTP_USER, SMTP_PASSWORD)
+    return client
+
+
+async def deliver_queued_emails(queue: asyncio.Queue):
+    """Send queued notifications over one SMTP session, reconnecting when it drops."""
+    client: Optional[aiosmtplib.SMTP] = None
+    last_used = 0.0
+    consecutive_failures = 0
+    try:
+        while True:
+            msg = await queue.get()
+            try:
+                if consecutive_failures:
+                    await asyncio.sleep(min(SMTP_FAILURE_BACKOFF_MAX_SECONDS, 2 ** (consecutive_failures - 1)))
+                if client is not None and time.monotonic() - last_used > SMTP_IDLE_CHECK_SECONDS:
+                    try:
+                        await client.noop()
+                    except (aiosmtplib.SMTPException, OSError):
+                        client.close()
+                        client = None
+                for attempt in range(2):
+                    try:
+                        if client is None or not client.is_connected:
+                            client = await _connect_smtp()
+                        await client.send_message(msg)
+                        last_used = time.monotonic()
+                        consecutive_failures = 0
+                        logger.info("notification.email.sent", extra={"to": msg['To'], "subject": msg['Subject']})
+                        break
+                    except (aiosmtplib.SMTPException, OSError) as e:
+                        # Servers close idle sessions; retry once on a fresh connection.
+                        if client is not None:
+                            client.close()
+                        client = None
+                        if attempt:
+                            consecutive_failures += 1
+                            logger.error("notification.email.smtp_failed", extra={"to": msg['To'], "error": str(e)})
+            finally:
+                queue.task_done()
+    finally:
+        if client is not None and client.is_connected:
+            client.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     db = SessionLocal()
     try:
         normalize_roles(db)
@@ -786,13 +1671,29 @@ async def lifespan(app: FastAPI):
             logger.info("bootstrap.demo_developer_ensured", extra={"user_id": demo_user.id})
     finally:
         db.close()
+    purge_task = asyncio.create_task(purge_failed_logins_periodically())
+    optimize_task = asyncio.create_task(optimize_sqlite_periodically()) if DATABASE_URL.startswith("sqlite") else None
+    global email_queue
+    email_queue = asyncio.Queue(maxsize=EMAIL_QUEUE_SIZE)
+    email_task = asyncio.create_task(deliver_queued_emails(email_queue))
     yield
+    purge_task.cancel()
+    if optimize_task:
+        optimize_task.cancel()
+    # Requests returned "queued" already; give the worker a bounded window to deliver them before exiting
+    try:
+        await asyncio.wait_for(email_queue.join(), EMAIL_SHUTDOWN_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("notification.email.dropped_on_shutdown", extra={"pending": email_queue.qsize()})
+    email_task.cancel()
+    email_queue = None
     logger.info("app.shutdown")
 
 fastapi_kwargs = {
     "title": "Automation Hub API",
     "version": "3.0.0",
     "lifespan": lifespan,
+    "default_response_class": ORJSONResponse,
 }
 if not DEBUG_MODE:
     fastapi_kwargs.update({"docs_url": None, "redoc_url": None})
@@ -801,18 +1702,20 @@ app = FastAPI(**fastapi_kwargs)
 cors_kwargs = {
     "allow_origins": ALLOWED_ORIGINS,
     "allow_credentials": True,
-    "allow_methods": ["*"],
+    "allow_methods": ALLOWED_METHODS,
     "allow_headers": ["*"],
+    "max_age": CORS_MAX_AGE_SECONDS,
+    "expose_headers": [NEXT_CURSOR_HEADER],
 }
 if DEBUG_MODE:
-    cors_kwargs["allow_origin_regex"] = r"http://localhost:\\d+"
+    cors_kwargs["allow_origin_regex"] = DEBUG_ORIGIN_REGEX
 
 app.add_middleware(CORSMiddleware, **cors_kwargs)
 
 
 # Routes - Authentication
 @app.post("/auth/login", response_model=LoginResponse)
-async def login(login_data: LoginRequest, request: FastAPIRequest, db: Session = Depends(get_db)):
+def login(login_data: LoginRequest, request: FastAPIRequest, db: Session = Depends(get_db)):
     client_ip = request.client.host if request.client else "unknown"
     if is_ip_blocked(client_ip):
         raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many failed attempts. Please try again later.")
@@ -828,20 +1731,19 @@ async def login(login_data: LoginRequest, request: FastAPIRequest, db: Session =
     
     reset_failed_logins(client_ip)
     logger.info("login.success", extra={"user": user.email, "ip": client_ip})
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email}, expires_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60
     )
     
     return LoginResponse(
         access_token=access_token,
-        user=UserResponse.model_validate(user)
+        user=construct_from(UserResponse, user)
     )
 
 
 # Routes - Registration Requests
 @app.post("/auth/register", response_model=RegistrationRequestResponse, status_code=status.HTTP_201_CREATED)
-async def create_registration_request(
+def create_registration_request(
     registration_data: RegistrationRequestCreate,
     db: Session = Depends(get_db)
 ):
@@ -849,38 +1751,35 @@ async def create_registration_request(
     normalized_email = normalize_email(registration_data.email)
     company_title = registration_data.company_title.strip()
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == normalized_email).first()
-    if existing_user:
+    if db.execute(EMAIL_REGISTERED, {"email": normalized_email}).scalar():
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Check if there's already a pending request
-    existing_request = db.query(RegistrationRequest).filter(
-        RegistrationRequest.email == normalized_email,
-        RegistrationRequest.status == "PENDING"
-    ).first()
-    if existing_request:
+    # Cheap rejection of resubmissions before paying for the password hash
+    if db.execute(REGISTRATION_PENDING, {"email": normalized_email}).scalar():
         raise HTTPException(status_code=400, detail="Registration request already pending")
-
+    
     if not company_title:
         raise HTTPException(status_code=400, detail="Company title is required")
     
     try:
-        new_request = RegistrationRequest(
+        created_at = current_time_ms()
+        # The partial unique index on pending emails still catches a concurrent duplicate at insert time
+        request_id = insert_or_ignore(
+            db,
+            RegistrationRequest,
+            ["email"],
+            index_where=text("status = 'PENDING'"),
             name=registration_data.name,
             email=normalized_email,
             password=get_password_hash(registration_data.password),
             status="PENDING",
             company_title=company_title,
-            created_at=int(time.time() * 1000)
+            created_at=created_at,
         )
-        
-        db.add(new_request)
+        if request_id is None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Registration request already pending")
         db.commit()
-        db.refresh(new_request)
-        
-        # Extract values before session closes to avoid lazy-loading issues
-        request_id = new_request.id
-        created_at = new_request.created_at
         
         # Use safe log field names (avoid reserved LogRecord attributes like "name")
         logger.info(
@@ -899,6 +1798,8 @@ async def create_registration_request(
             reviewed_by=None,
             reviewed_at=None
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("registration.request.failed", extra={"error": str(e)})
         db.rollback()
@@ -906,59 +1807,67 @@ async def create_registration_request(
 
 
 @app.get("/registration-requests", response_model=List[RegistrationRequestResponse])
-async def list_registration_requests(
+def list_registration_requests(
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    requests = db.query(RegistrationRequest).order_by(RegistrationRequest.created_at.desc()).all()
-    return requests
+    # Only the serialized columns are read, so password hashes never leave the database
+    columns = [RegistrationRequest.__table__.c[name] for name in RegistrationRequestResponse.model_fields]
+    rows = db.execute(select(*columns).order_by(RegistrationRequest.created_at.desc())).mappings()
+    return list_response(registration_list_adapter, [RegistrationRequestResponse.model_construct(**row) for row in rows])
 
 
 @app.post("/registration-requests/{request_id}/approve", response_model=UserResponse)
-async def approve_registration_request(
+def approve_registration_request(
     request_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    reg_request = db.query(RegistrationRequest).filter(RegistrationRequest.id == request_id).first()
+    reg_request = db.get(RegistrationRequest, request_id)
     if not reg_request:
         raise HTTPException(status_code=404, detail="Registration request not found")
     
     if reg_request.status != "PENDING":
         raise HTTPException(status_code=400, detail="Request already processed")
     
-    # Create user
+    # Create user; the unique email index turns an already-registered email into a no-op instead of an IntegrityError
     avatar_seed = reg_request.name.lower().replace(" ", "")
-    new_user = User(
+    values = dict(
         name=reg_request.name,
-        email=normalize_email(reg_request.email),
+        email=reg_request.email,  # Normalized when the registration was submitted
         password=reg_request.password,  # Already hashed
         role=EMPLOYEE_ROLE,  # New users are employees by default
         company_title=reg_request.company_title,
         avatar=f"https://api.dicebear.com/7.x/avataaars/svg?seed={avatar_seed}"
     )
+    user_id = insert_or_ignore(db, User, ["email"], **values)
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    db.add(new_user)
-    
-    # Update request
-    reg_request.status = "APPROVED"
-    reg_request.reviewed_by = current_user.id
-    reg_request.reviewed_at = int(time.time() * 1000)
+    # Update request only if it is still pending, so two concurrent approvals can't both succeed
+    claimed = db.execute(
+        update(RegistrationRequest)
+        .where(RegistrationRequest.id == request_id, RegistrationRequest.status == "PENDING")
+        .values(status="APPROVED", reviewed_by=current_user.id, reviewed_at=current_time_ms())
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Request already processed")
     
     db.commit()
-    db.refresh(new_user)
+    new_user = User(id=user_id, **values)
     
     logger.info("registration.approved", extra={"request_id": request_id, "approved_by": current_user.id, "user_id": new_user.id})
-    return new_user
+    return model_response(construct_from(UserResponse, new_user))
 
 
 @app.post("/registration-requests/{request_id}/reject")
-async def reject_registration_request(
+def reject_registration_request(
     request_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    reg_request = db.query(RegistrationRequest).filter(RegistrationRequest.id == request_id).first()
+    reg_request = db.get(RegistrationRequest, request_id)
     if not reg_request:
         raise HTTPException(status_code=404, detail="Registration request not found")
     
@@ -967,7 +1876,7 @@ async def reject_registration_request(
     
     reg_request.status = "REJECTED"
     reg_request.reviewed_by = current_user.id
-    reg_request.reviewed_at = int(time.time() * 1000)
+    reg_request.reviewed_at = current_time_ms()
     
     db.commit()
     
@@ -978,20 +1887,20 @@ async def reject_registration_request(
 # Routes - User Management
 @app.get("/users/me", response_model=UserResponse)
 async def read_users_me(current_user: User = Depends(get_current_user)):
-    return current_user
+    return model_response(construct_from(UserResponse, current_user))
 
 
 @app.get("/users", response_model=List[UserResponse])
-async def list_users(
+def list_users(
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
     users = db.query(User).all()
-    return users
+    return list_response(user_list_adapter, [construct_from(UserResponse, user) for user in users])
 
 
 @app.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(
+def create_user(
     user_data: UserCreate,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
@@ -999,19 +1908,19 @@ async def create_user(
     enforce_password_policy(user_data.password)
     normalized_email = normalize_email(user_data.email)
     company_title = user_data.company_title.strip()
-    existing_user = db.query(User).filter(User.email == normalized_email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
 
     if user_data.role not in VALID_ROLES:
         raise HTTPException(status_code=400, detail="Invalid system role")
     if not company_title:
         raise HTTPException(status_code=400, detail="Company title is required")
+    # Cheap pre-check so an obvious duplicate doesn't pay for a password hash; the insert below still guards races
+    if db.execute(EMAIL_REGISTERED, {"email": normalized_email}).scalar():
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     avatar_seed = user_data.name.lower().replace(" ", "")
     avatar_url = f"https://api.dicebear.com/7.x/avataaars/svg?seed={avatar_seed}"
     
-    new_user = User(
+    values = dict(
         name=user_data.name,
         email=normalized_email,
         password=get_password_hash(user_data.password),
@@ -1019,22 +1928,23 @@ async def create_user(
         company_title=company_title,
         avatar=avatar_url
     )
-    
-    db.add(new_user)
+    # The unique email index rejects duplicates inside the insert itself, so concurrent creates can't race
+    user_id = insert_or_ignore(db, User, ["email"], **values)
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
     db.commit()
-    db.refresh(new_user)
-    logger.info("user.created", extra={"created_by": current_user.id, "user_id": new_user.id, "role": new_user.role})
+    logger.info("user.created", extra={"created_by": current_user.id, "user_id": user_id, "role": user_data.role})
     
-    return new_user
+    return model_response(construct_from(UserResponse, User(id=user_id, **values)), status.HTTP_201_CREATED)
 
 
 @app.post("/users/{user_id}/promote", response_model=UserResponse)
-async def promote_user(
+def promote_user(
     user_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user.role == DEVELOPER_ROLE:
@@ -1042,18 +1952,18 @@ async def promote_user(
 
     user.role = DEVELOPER_ROLE
     db.commit()
-    db.refresh(user)
+    invalidate_cached_user(user.email)
     logger.info("user.promoted", extra={"user_id": user.id, "promoted_by": current_user.id})
-    return user
+    return model_response(construct_from(UserResponse, user))
 
 
 @app.post("/users/{user_id}/demote", response_model=UserResponse)
-async def demote_user(
+def demote_user(
     user_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user.role != DEVELOPER_ROLE:
@@ -1066,105 +1976,119 @@ async def demote_user(
 
     user.role = EMPLOYEE_ROLE
     db.commit()
-    db.refresh(user)
+    invalidate_cached_user(user.email)
     logger.info("user.demoted", extra={"user_id": user.id, "demoted_by": current_user.id})
-    return user
+    return model_response(construct_from(UserResponse, user))
 
 
 @app.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(
+def delete_user(
     user_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    if user_id == current_user.id:
+        raise HTTPException(status_code=400, detail="Cannot delete your own account")
+
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    if user.id == current_user.id:
-        raise HTTPException(status_code=400, detail="Cannot delete your own account")
 
     if user.role == DEVELOPER_ROLE and get_developer_count(db) <= 1:
         raise HTTPException(status_code=400, detail="Cannot delete the last developer account")
 
-    # Delete requests created by this user (and associated script nodes)
-    user_requests = db.query(Request).filter(Request.requester_id == user.id).all()
-
-    def delete_node_recursive(node: ScriptNode):
-        children = db.query(ScriptNode).filter(ScriptNode.parent_id == node.id).all()
-        for child in children:
-            delete_node_recursive(child)
-        db.delete(node)
-
-    for req in user_requests:
-        linked_nodes = db.query(ScriptNode).filter(ScriptNode.request_id == req.id).all()
-        for node in linked_nodes:
-            delete_node_recursive(node)
-        db.delete(req)
+    # Delete requests created by this user (and associated script nodes) in a fixed number of statements
+    user_request_ids = select(Request.id).where(Request.requester_id == user.id)
+    db.execute(
+        delete(ScriptNode)
+        .where(ScriptNode.id.in_(select(script_subtree(ScriptNode.request_id.in_(user_request_ids)).c.id)))
+        .execution_options(synchronize_session=False)
+    )
+    for model in (Attachment, ResultFile, SubmissionEvent, Comment, ScriptFolderItem):
+        db.execute(
+            delete(model).where(model.request_id.in_(user_request_ids)).execution_options(synchronize_session=False)
+        )
+    db.execute(
+        delete(Request).where(Request.requester_id == user.id).execution_options(synchronize_session=False)
+    )
 
-    db.delete(user)
+    user_email = user.email
+    db.execute(delete(User).where(User.id == user.id).execution_options(synchronize_session=False))
     db.commit()
+    invalidate_cached_user(user_email)
 
     logger.info("user.deleted", extra={"user_id": user_id, "deleted_by": current_user.id})
     return None
 
 
 # Routes - Request Management
-@app.get("/requests", response_model=List[RequestResponse])
-async def list_requests(
+@app.get("/requests", response_model=Union[List[RequestListResponse], List[RequestListItem]])
+def list_requests(
+    request: FastAPIRequest,
     status: Optional[str] = None,
+    # includeData=false leaves file payloads out of the listing (and the query); fetch them via the /raw endpoints
+    include_data: bool = Query(True, alias="includeData"),
+    # Optional keyset paging: without limit the whole list is returned, as the frontend expects
+    limit: Optional[int] = Query(None, ge=1, le=MAX_REQUEST_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Request).options(
-        joinedload(Request.attachments),
-        joinedload(Request.result_files),
-        joinedload(Request.submission_events)
-    )
-    
+    criteria = []
     if current_user.role == EMPLOYEE_ROLE:
-        query = query.filter(Request.requester_id == current_user.id)
+        criteria.append(Request.requester_id == current_user.id)
     
     if status:
-        query = query.filter(Request.status == status)
+        criteria.append(Request.status == status)
     
-    requests = query.order_by(Request.created_at.desc()).all()
-    return requests
+    if cursor:
+        try:
+            created_at, request_id = (int(part) for part in cursor.split(":"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        criteria.append(tuple_(Request.created_at, Request.id) < (created_at, request_id))
+    
+    # One row past the page tells whether another page exists, so the last page carries no cursor
+    items = fetch_request_list(db, criteria, include_data, None if limit is None else limit + 1)
+    has_more = limit is not None and len(items) > limit
+    if has_more:
+        items = items[:limit]
+    response = conditional_response(
+        request, list_response(request_list_adapter if include_data else request_list_item_adapter, items)
+    )
+    if has_more:
+        response.headers[NEXT_CURSOR_HEADER] = f"{items[-1].created_at}:{items[-1].id}"
+    return response
 
 
 @app.get("/requests/{request_id}", response_model=RequestResponse)
-async def get_request(
+def get_request(
     request_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    request_obj = db.query(Request).options(
-        joinedload(Request.attachments),
-        joinedload(Request.result_files),
-        joinedload(Request.submission_events),
-        joinedload(Request.comments)
-    ).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id, options=REQUEST_RESPONSE_OPTIONS)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     
     if current_user.role == EMPLOYEE_ROLE and request_obj.requester_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return request_obj
+    return model_response(build_request_response(request_obj, RequestResponse))
 
 
-@app.post("/requests", response_model=RequestResponse, status_code=status.HTTP_201_CREATED)
-async def create_request(
+@app.post("/requests", response_model=RequestSummaryResponse, status_code=status.HTTP_201_CREATED)
+def create_request(
     request_data: RequestCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    current_time = int(time.time() * 1000)
+    current_time = current_time_ms()
 
     if current_user.role == DEVELOPER_ROLE:
         requester_id = request_data.requester_id or current_user.id
         requester_name = request_data.requester_name or current_user.name
-        requester = db.query(User).filter(User.id == requester_id).first()
+        requester = db.get(User, requester_id)
         if not requester:
             raise HTTPException(status_code=404, detail="Requester not found")
         requester_name = requester.name
@@ -1191,33 +2115,34 @@ async def create_request(
     )
     
     db.add(new_request)
-    db.commit()
-    db.refresh(new_request)
-    
-    for attachment_data in request_data.attachments:
-        attachment = Attachment(
-            request_id=new_request.id,
-            name=attachment_data.name,
-            type=attachment_data.type,
-            data=attachment_data.data
-        )
-        db.add(attachment)
+    db.flush()
+    
+    if request_data.attachments:
+        # One multi-row INSERT instead of a round-trip per attachment
+        db.execute(insert(Attachment), [
+            {
+                "request_id": new_request.id,
+                "name": attachment_data.name,
+                "type": attachment_data.type,
+                "data": decode_data_url(attachment_data.data),
+            }
+            for attachment_data in request_data.attachments
+        ])
     
     db.commit()
-    db.refresh(new_request)
     logger.info("request.created", extra={"request_id": new_request.id, "created_by": current_user.id, "requester_id": requester_id})
     
-    return new_request
+    return model_response(construct_from(RequestSummaryResponse, new_request), status.HTTP_201_CREATED)
 
 
-@app.put("/requests/{request_id}", response_model=RequestResponse)
-async def update_request(
+@app.put("/requests/{request_id}", response_model=RequestSummaryResponse)
+def update_request(
     request_id: int,
     request_update: RequestUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    request_obj = db.query(Request).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     if current_user.role != DEVELOPER_ROLE and request_obj.requester_id != current_user.id:
@@ -1232,37 +2157,38 @@ async def update_request(
     for field, value in update_data.items():
         setattr(request_obj, field, value)
     
-    request_obj.updated_at = int(time.time() * 1000)
+    request_obj.updated_at = current_time_ms()
     
     db.commit()
-    db.refresh(request_obj)
     logger.info("request.updated", extra={"request_id": request_id, "updated_by": current_user.id})
     
-    return request_obj
+    return model_response(construct_from(RequestSummaryResponse, request_obj))
 
 
 @app.post("/requests/{request_id}/result-files")
-async def add_result_files(
+def add_result_files(
     request_id: int,
     files: List[AttachmentCreate],
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    request_obj = db.query(Request).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    now_ms = int(time.time() * 1000)
-    for file_data in files:
-        result_file = ResultFile(
-            request_id=request_id,
-            name=file_data.name,
-            type=file_data.type,
-            data=file_data.data
-        )
-        db.add(result_file)
-    
-    event_type = "SUBMISSION" if len(request_obj.submission_events or []) == 0 else "RESUBMISSION"
+    now_ms = current_time_ms()
+    if files:
+        db.execute(insert(ResultFile), [
+            {
+                "request_id": request_id,
+                "name": file_data.name,
+                "type": file_data.type,
+                "data": decode_data_url(file_data.data),
+            }
+            for file_data in files
+        ])
+    
+    event_type = "SUBMISSION" if request_obj.submission_count == 0 else "RESUBMISSION"
     event = SubmissionEvent(
         request_id=request_id,
         event_type=event_type,
@@ -1270,35 +2196,41 @@ async def add_result_files(
         added_files=len(files)
     )
     db.add(event)
+    # Atomic in-database increment so concurrent submissions never lose a count
+    request_obj.submission_count = Request.submission_count + 1
     request_obj.updated_at = now_ms
     
     db.commit()
-    db.refresh(request_obj)
     
     return {"status": "success", "count": len(files), "eventType": event_type}
 
 
 @app.delete("/requests/{request_id}/result-files/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_result_file(
+def delete_result_file(
     request_id: int,
     file_id: int,
     name: Optional[str] = None,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    request_obj = db.query(Request).options(joinedload(Request.result_files)).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    target = None
-    for rf in request_obj.result_files:
-        if rf.id == file_id or (name and rf.name == name):
-            target = rf
-            break
+    # Look up just the matching row; loading the whole collection would pull every file's bytes
+    match = ResultFile.id == file_id
+    if name:
+        match = match | (ResultFile.name == name)
+    target = (
+        db.query(ResultFile)
+        .filter(ResultFile.request_id == request_id, match)
+        .order_by(ResultFile.id)
+        .first()
+    )
     if not target:
         raise HTTPException(status_code=404, detail="Result file not found for this request")
     
-    now_ms = int(time.time() * 1000)
+    now_ms = current_time_ms()
     request_obj.updated_at = now_ms
     
     db.delete(target)
@@ -1309,16 +2241,19 @@ async def delete_result_file(
 
 # Routes - Script Folders
 @app.get("/script-folders", response_model=List[ScriptFolderResponse])
-async def list_folders(
+def list_folders(
+    request: FastAPIRequest,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    folders = db.query(ScriptFolder).order_by(ScriptFolder.created_at.desc()).all()
-    return folders
+    columns = [ScriptFolder.__table__.c[name] for name in ScriptFolderResponse.model_fields]
+    rows = db.execute(select(*columns).order_by(ScriptFolder.created_at.desc())).mappings()
+    folders = [ScriptFolderResponse.model_construct(**row) for row in rows]
+    return conditional_response(request, list_response(folder_list_adapter, folders))
 
 
 @app.post("/script-folders", response_model=ScriptFolderResponse, status_code=status.HTTP_201_CREATED)
-async def create_folder(
+def create_folder(
     folder_data: ScriptFolderCreate,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
@@ -1328,91 +2263,85 @@ async def create_folder(
         description=folder_data.description,
         color=folder_data.color,
         created_by=current_user.id,
-        created_at=int(time.time() * 1000)
+        created_at=current_time_ms()
     )
     
     db.add(new_folder)
     db.commit()
-    db.refresh(new_folder)
     
-    return new_folder
+    return model_response(construct_from(ScriptFolderResponse, new_folder), status.HTTP_201_CREATED)
 
 
 @app.post("/script-folders/{folder_id}/add-request/{request_id}")
-async def add_request_to_folder(
+def add_request_to_folder(
     folder_id: int,
     request_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    folder = db.query(ScriptFolder).filter(ScriptFolder.id == folder_id).first()
+    folder = db.get(ScriptFolder, folder_id)
     if not folder:
         raise HTTPException(status_code=404, detail="Folder not found")
     
-    request_obj = db.query(Request).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    # Check if already in folder
-    existing = db.query(ScriptFolderItem).filter(
-        ScriptFolderItem.folder_id == folder_id,
-        ScriptFolderItem.request_id == request_id
-    ).first()
-    
-    if existing:
+    item_id = insert_or_ignore(
+        db, ScriptFolderItem, ["folder_id", "request_id"], folder_id=folder_id, request_id=request_id
+    )
+    if item_id is None:
         raise HTTPException(status_code=400, detail="Request already in folder")
-    
-    item = ScriptFolderItem(folder_id=folder_id, request_id=request_id)
-    db.add(item)
     db.commit()
     
     return {"status": "added"}
 
 
 @app.delete("/script-folders/{folder_id}/remove-request/{request_id}")
-async def remove_request_from_folder(
+def remove_request_from_folder(
     folder_id: int,
     request_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    item = db.query(ScriptFolderItem).filter(
-        ScriptFolderItem.folder_id == folder_id,
-        ScriptFolderItem.request_id == request_id
-    ).first()
-    
-    if not item:
+    # Delete directly; the affected row count doubles as the existence check
+    result = db.execute(
+        delete(ScriptFolderItem).where(
+            ScriptFolderItem.folder_id == folder_id,
+            ScriptFolderItem.request_id == request_id
+        )
+    )
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Item not found in folder")
     
-    db.delete(item)
     db.commit()
     
     return {"status": "removed"}
 
 
-@app.get("/script-folders/{folder_id}/requests", response_model=List[RequestResponse])
-async def get_folder_requests(
+@app.get("/script-folders/{folder_id}/requests", response_model=List[RequestListResponse])
+def get_folder_requests(
     folder_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    folder = db.query(ScriptFolder).filter(ScriptFolder.id == folder_id).first()
+    folder = db.get(ScriptFolder, folder_id)
     if not folder:
         raise HTTPException(status_code=404, detail="Folder not found")
     
-    request_ids = [item.request_id for item in folder.items]
-    requests = db.query(Request).filter(Request.id.in_(request_ids)).all()
+    # Membership is resolved in the same query instead of loading every folder item first
+    member_ids = select(ScriptFolderItem.request_id).where(ScriptFolderItem.folder_id == folder_id)
     
-    return requests
+    return list_response(request_list_adapter, fetch_request_list(db, [Request.id.in_(member_ids)]))
 
 
 @app.delete("/script-folders/{folder_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_folder(
+def delete_folder(
     folder_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    folder = db.query(ScriptFolder).filter(ScriptFolder.id == folder_id).first()
+    folder = db.get(ScriptFolder, folder_id)
     if not folder:
         raise HTTPException(status_code=404, detail="Folder not found")
     
@@ -1424,26 +2353,28 @@ async def delete_folder(
 
 # Routes - Script Tree (Nested, role-aware)
 @app.get("/script-tree", response_model=List[ScriptNodeResponse])
-async def list_script_tree(
+def list_script_tree(
+    request: FastAPIRequest,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    root = ensure_root_script_folder(db, current_user)
-    sync_completed_requests_into_tree(db, current_user, root)
+    now = current_time_ms()
+    root = ensure_root_script_folder(db, current_user, now)
+    sync_completed_requests_into_tree(db, current_user, root, now)
     nodes = db.query(ScriptNode).all()
-    return build_script_tree(nodes)
+    return conditional_response(request, list_response(script_tree_adapter, build_script_tree(db, nodes)))
 
 
 @app.post("/script-tree/folder", response_model=ScriptNodeResponse, status_code=status.HTTP_201_CREATED)
-async def create_script_tree_folder(
+def create_script_tree_folder(
     folder_data: ScriptFolderNodeCreate,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    root = ensure_root_script_folder(db, current_user)
+    now = current_time_ms()
+    root = ensure_root_script_folder(db, current_user, now)
     parent = get_folder_or_404(db, folder_data.parent_id or root.id)
     
-    now = int(time.time() * 1000)
     node = ScriptNode(
         name=folder_data.name,
         type="FOLDER",
@@ -1455,31 +2386,30 @@ async def create_script_tree_folder(
     )
     db.add(node)
     db.commit()
-    db.refresh(node)
     return node
 
 
 @app.post("/script-tree/file", response_model=ScriptNodeResponse, status_code=status.HTTP_201_CREATED)
-async def create_script_file_link(
+def create_script_file_link(
     file_data: ScriptFileCreate,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    root = ensure_root_script_folder(db, current_user)
+    now = current_time_ms()
+    root = ensure_root_script_folder(db, current_user, now)
     parent = get_folder_or_404(db, file_data.parent_id or root.id)
-    request_obj = db.query(Request).filter(Request.id == file_data.request_id).first()
+    request_obj = db.get(Request, file_data.request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    existing = db.query(ScriptNode).filter(
+    already_linked = db.execute(select(exists().where(
         ScriptNode.type == "FILE",
         ScriptNode.parent_id == parent.id,
         ScriptNode.request_id == request_obj.id
-    ).first()
-    if existing:
+    ))).scalar()
+    if already_linked:
         raise HTTPException(status_code=400, detail="Script already linked in this folder")
 
-    now = int(time.time() * 1000)
     node = ScriptNode(
         name=file_data.name or request_obj.title,
         type="FILE",
@@ -1491,18 +2421,17 @@ async def create_script_file_link(
     )
     db.add(node)
     db.commit()
-    db.refresh(node)
     return node
 
 
 @app.put("/script-tree/{node_id}", response_model=ScriptNodeResponse)
-async def update_script_node(
+def update_script_node(
     node_id: int,
     node_update: ScriptNodeUpdate,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    node = db.query(ScriptNode).filter(ScriptNode.id == node_id).first()
+    node = db.get(ScriptNode, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     if node.parent_id is None:
@@ -1510,70 +2439,74 @@ async def update_script_node(
 
     if node_update.parent_id is not None:
         new_parent = get_folder_or_404(db, node_update.parent_id)
-        cursor = new_parent
-        while cursor:
-            if cursor.id == node.id:
-                raise HTTPException(status_code=400, detail="Cannot move a folder into itself")
-            cursor = cursor.parent
+        # Walk up from the target rather than down from the node: a path to the root is short, a subtree may not be
+        ancestors = script_ancestors(new_parent.id)
+        moves_into_itself = db.execute(select(ancestors.c.id).where(ancestors.c.id == node.id)).first()
+        if moves_into_itself:
+            raise HTTPException(status_code=400, detail="Cannot move a folder into itself")
         node.parent_id = new_parent.id
 
     if node_update.name:
         node.name = node_update.name
 
-    node.updated_at = int(time.time() * 1000)
+    node.updated_at = current_time_ms()
     db.commit()
-    db.refresh(node)
+    invalidate_script_folder_cache()
     return node
 
 
 @app.delete("/script-tree/{node_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_script_node(
+def delete_script_node(
     node_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    node = db.query(ScriptNode).filter(ScriptNode.id == node_id).first()
+    node = db.get(ScriptNode, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     if node.parent_id is None:
         raise HTTPException(status_code=400, detail="Root folder cannot be deleted")
 
-    def delete_recursive(n: ScriptNode):
-        children = db.query(ScriptNode).filter(ScriptNode.parent_id == n.id).all()
-        for child in children:
-            delete_recursive(child)
-        db.delete(n)
-
-    delete_recursive(node)
+    db.execute(
+        delete(ScriptNode)
+        .where(ScriptNode.id.in_(select(script_subtree(ScriptNode.id == node.id).c.id)))
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
+    invalidate_script_folder_cache()
     return None
 
 
 @app.get("/script-tree/export")
-async def export_script_library(
+def export_script_library(
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
 ):
-    root = ensure_root_script_folder(db, current_user)
-    sync_completed_requests_into_tree(db, current_user, root)
+    now = current_time_ms()
+    root = ensure_root_script_folder(db, current_user, now)
+    sync_completed_requests_into_tree(db, current_user, root, now)
 
     nodes = db.query(ScriptNode).all()
+    # Only requests behind FILE nodes matter; payloads are fetched in batches while the archive streams
+    needed_request_ids = {node.request_id for node in nodes if node.type == "FILE" and node.request_id}
     requests_with_files = {
-        req.id: req for req in db.query(Request).options(joinedload(Request.result_files)).all()
-    }
+        req.id: req for req in db.query(Request).options(
+            selectinload(Request.result_files)
+        ).filter(Request.id.in_(needed_request_ids)).all()
+    } if needed_request_ids else {}
 
     children_map: Dict[Optional[int], List[ScriptNode]] = defaultdict(list)
     for node in nodes:
         children_map[node.parent_id].append(node)
 
-    buffer = io.BytesIO()
-    zf = zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
+    # (archive path, result file id); directories carry no file id
+    entries: List[tuple] = []
 
     def walk(node: ScriptNode, base_path: str):
         if node.type == "FOLDER":
             folder_path = os.path.join(base_path, node.name) if base_path else node.name
             if not children_map.get(node.id):
-                zf.writestr(folder_path.rstrip("/") + "/", "")
+                entries.append((folder_path.rstrip("/") + "/", None))
             for child in children_map.get(node.id, []):
                 walk(child, folder_path)
         else:
@@ -1585,22 +2518,40 @@ async def export_script_library(
                     attachment = req.result_files[0]
             if not attachment:
                 return
-            try:
-                payload = attachment.data.split(",", 1)[1] if "," in attachment.data else attachment.data
-                content = base64.b64decode(payload)
-            except Exception:
-                content = attachment.data.encode()
             file_path = os.path.join(base_path, node.name) if base_path else node.name
-            zf.writestr(file_path, content)
+            entries.append((file_path, attachment.id))
 
     for child in children_map.get(root.id, []):
         walk(child, "")
 
-    zf.close()
-    buffer.seek(0)
+    def stream_zip():
+        # The request's session is closed once the handler returns; the body reads through its own
+        sink = ZipStreamSink()
+        stream_db = SessionLocal()
+        try:
+            with zipfile.ZipFile(sink, mode="w") as zf:
+                for start in range(0, len(entries), EXPORT_FETCH_BATCH_SIZE):
+                    batch = entries[start:start + EXPORT_FETCH_BATCH_SIZE]
+                    file_ids = [file_id for _, file_id in batch if file_id is not None]
+                    payloads = dict(stream_db.execute(
+                        select(ResultFile.id, ResultFile.data).where(ResultFile.id.in_(file_ids))
+                    ).all()) if file_ids else {}
+                    for path, file_id in batch:
+                        if file_id is None:
+                            data = b""
+                        elif file_id in payloads:
+                            data = payloads[file_id]
+                        else:
+                            continue  # deleted after the walk
+                        zf.writestr(path, data, compress_type=zip_compression_for(data))
+                        yield sink.drain()
+            yield sink.drain()
+        finally:
+            stream_db.close()
+
     filename = "script-library.zip"
     return StreamingResponse(
-        buffer,
+        stream_zip(),
         media_type="application/zip",
         headers={"Content-Disposition": f'attachment; filename=\"{filename}\"'}
     )
@@ -1608,33 +2559,36 @@ async def export_script_library(
 
 # Routes - Comments on Requests
 @app.get("/requests/{request_id}/comments", response_model=List[CommentResponse])
-async def list_comments(
+def list_comments(
     request_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    request_obj = db.query(Request).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     if current_user.role == EMPLOYEE_ROLE and request_obj.requester_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    comments = db.query(Comment).filter(Comment.request_id == request_id).order_by(Comment.created_at.asc()).all()
-    return comments
+    columns = [Comment.__table__.c[name] for name in CommentResponse.model_fields]
+    rows = db.execute(
+        select(*columns).where(Comment.request_id == request_id).order_by(Comment.created_at.asc())
+    ).mappings()
+    return list_response(comment_list_adapter, [CommentResponse.model_construct(**row) for row in rows])
 
 
 @app.post("/requests/{request_id}/comments", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
-async def add_comment(
+def add_comment(
     request_id: int,
     payload: CommentCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    request_obj = db.query(Request).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     if current_user.role == EMPLOYEE_ROLE and request_obj.requester_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    now_ms = int(time.time() * 1000)
+    now_ms = current_time_ms()
     comment = Comment(
         request_id=request_id,
         user_id=current_user.id,
@@ -1644,13 +2598,69 @@ async def add_comment(
     )
     db.add(comment)
     db.commit()
-    db.refresh(comment)
-    return comment
+    return model_response(construct_from(CommentResponse, comment), status.HTTP_201_CREATED)
+
+
+# Routes - Attachments
+@app.get("/attachments/{attachment_id}/raw")
+def download_attachment_raw(
+    attachment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    attachment = db.get(Attachment, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    if current_user.role == EMPLOYEE_ROLE and attachment.request.requester_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return file_download_response(db, Attachment, attachment)
+
+
+@app.get("/result-files/{file_id}/raw")
+def download_result_file_raw(
+    file_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    result_file = db.get(ResultFile, file_id)
+    if not result_file:
+        raise HTTPException(status_code=404, detail="Result file not found")
+    if current_user.role == EMPLOYEE_ROLE and result_file.request.requester_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return file_download_response(db, ResultFile, result_file)
 
 
 # Routes - AI Analysis
+# Gemini often wraps its JSON in a markdown fence, sometimes tagged json and sometimes left unclosed
+AI_RESPONSE_FENCE_RE = re.compile(r"^(?:```(?:json)?)?\s*(.*?)\s*(?:```)?$", re.S)
+REQUIRED_ANALYSIS_FIELDS = frozenset(("complexityScore", "suggestedNamespaces", "implementationStrategy", "pseudoCode"))
+
+
+def _get_cached_analysis(key: str) -> Optional[str]:
+    if redis_client is not None:
+        try:
+            raw = redis_client.get(f"ai:analysis:{key}")
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+            return None
+        return raw.decode() if raw else None
+    with ai_analysis_cache_lock:
+        return ai_analysis_cache.get(key)
+
+
+def _store_cached_analysis(key: str, analysis: str):
+    if redis_client is not None:
+        try:
+            redis_client.setex(f"ai:analysis:{key}", AI_ANALYSIS_CACHE_TTL_SECONDS, analysis)
+        except redis.RedisError as e:
+            logger.warning("cache.redis_unavailable", extra={"error": str(e)})
+        return
+    with ai_analysis_cache_lock:
+        ai_analysis_cache[key] = analysis
+
+
 @app.post("/requests/{request_id}/analyze")
-async def analyze_request(
+def analyze_request(
     request_id: int,
     current_user: User = Depends(require_developer),
     db: Session = Depends(get_db)
@@ -1658,7 +2668,7 @@ async def analyze_request(
     if not ENABLE_AI_ANALYSIS:
         raise HTTPException(status_code=403, detail="AI analysis is disabled")
     
-    request_obj = db.query(Request).filter(Request.id == request_id).first()
+    request_obj = db.get(Request, request_id)
     if not request_obj:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -1671,37 +2681,44 @@ PRIORITY: {request_obj.priority}
 Provide JSON with: complexityScore (1-10), suggestedNamespaces (array), implementationStrategy (string), pseudoCode (string)"""
     
     try:
-        content_parts = [system_prompt]
-        
-        image_attachments = [att for att in request_obj.attachments if att.type.startswith("image/")]
-        for attachment in image_attachments:
-            try:
-                content_parts.append({
-                    "mime_type": attachment.type,
-                    "data": attachment.data
-                })
-            except Exception as e:
-                logger.warning("ai.image_processing_failed", extra={"error": str(e)})
-        
-        model = genai.GenerativeModel("gemini-2.0-flash-exp")
-        response = model.generate_content(content_parts)
+        # Only image payloads are sent, so non-image attachments are never read from the database
+        image_ids = db.execute(
+            select(Attachment.id).where(Attachment.request_id == request_id, Attachment.type.like("image/%"))
+            .order_by(Attachment.id)
+        ).scalars().all()
+        cache_key = hashlib.sha256(f"{system_prompt}\0{image_ids}".encode()).hexdigest()
+        cached = _get_cached_analysis(cache_key)
+        if cached is not None:
+            if request_obj.ai_analysis != cached:
+                request_obj.ai_analysis = cached
+                request_obj.updated_at = current_time_ms()
+                db.commit()
+            return orjson.loads(cached)
         
-        response_text = response.text.strip()
-        
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        elif response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
+        content_parts = [system_prompt]
+        if image_ids:
+            image_attachments = db.execute(
+                select(Attachment.type, Attachment.data).where(Attachment.id.in_(image_ids)).order_by(Attachment.id)
+            ).all()
+            for mime_type, data in image_attachments:
+                content_parts.append({"mime_type": mime_type, "data": data})
         
-        response_text = response_text.strip()
+        # End the read transaction so no pooled connection is held during the slow outbound call
+        db.rollback()
+        response = GEMINI_MODEL.generate_content(content_parts)
         
-        analysis_result = json.loads(response_text)
+        payload = AI_RESPONSE_FENCE_RE.match(response.text.strip()).group(1)
+        analysis_result = orjson.loads(payload)
+        if not isinstance(analysis_result, dict):
+            raise ValueError("Analysis is not a JSON object")
+        missing = REQUIRED_ANALYSIS_FIELDS.difference(analysis_result)
+        if missing:
+            raise ValueError(f"Missing required fields: {sorted(missing)}")
         
-        request_obj.ai_analysis = json.dumps(analysis_result)
-        request_obj.updated_at = int(time.time() * 1000)
+        request_obj.ai_analysis = orjson.dumps(analysis_result).decode()
+        request_obj.updated_at = current_time_ms()
         db.commit()
+        _store_cached_analysis(cache_key, request_obj.ai_analysis)
         
         return analysis_result
         
@@ -1717,25 +2734,20 @@ async def send_email_notification(
     current_user: User = Depends(get_current_user)
 ):
     recipient = notification.to or DEFAULT_ADMIN_EMAIL
-    
-    if SMTP_USER and SMTP_PASSWORD:
+
+    if SMTP_USER and SMTP_PASSWORD and email_queue is not None:
+        msg = MIMEMultipart()
+        msg['From'] = SMTP_FROM
+        msg['To'] = recipient
+        msg['Subject'] = notification.subject
+        msg.attach(MIMEText(notification.body, 'html'))
         try:
-            msg = MIMEMultipart()
-            msg['From'] = SMTP_FROM
-            msg['To'] = recipient
-            msg['Subject'] = notification.subject
-            msg.attach(MIMEText(notification.body, 'html'))
-            
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.send_message(msg)
-            
-            logger.info("notification.email.sent", extra={"to": recipient, "subject": notification.subject})
-            return {"status": "sent", "to": recipient, "method": "smtp"}
-        except Exception as e:
-            logger.error("notification.email.smtp_failed", extra={"to": recipient, "error": str(e)})
-    
+            email_queue.put_nowait(msg)
+            return {"status": "queued", "to": recipient, "method": "smtp"}
+        except asyncio.QueueFull:
+            logger.error("notification.email.queue_full", extra={"to": recipient})
+            raise HTTPException(status_code=503, detail="Email queue is full")
+
     logger.info("notification.email.logged", extra={"to": recipient, "subject": notification.subject})
     return {"status": "logged", "to": recipient, "method": "console"}
 
@@ -1757,5 +2769,8 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    logger.info("server.starting", extra={"version": "3.0.0"})
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    logger.info("server.starting", extra={"version": "3.0.0", "workers": workers})
+    # Schema setup above has already run in this process, so workers start against an up-to-date database.
+    # uvicorn[standard] supplies uvloop and httptools, which "auto" selects when available.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers, loop="auto", http="auto")
@@ -18,8 +18,13 @@ def setup_module(module):
 
 
 def teardown_module(module):
-    if TEST_DB_PATH.exists():
-        TEST_DB_PATH.unlink()
+    import main
+
+    main.engine.dispose()
+    db_path = Path(main.engine.url.database)
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        if path.exists():
+            path.unlink()
 
 
 @pytest.fixture(scope="module")
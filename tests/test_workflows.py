@@ -0,0 +1,507 @@
+import base64
+import os
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+TEST_DB_PATH = Path("test_workflows.db")
+
+
+def setup_module(module):
+    # Ensure we don't touch the real database
+    if TEST_DB_PATH.exists():
+        TEST_DB_PATH.unlink()
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DB_PATH}"
+    os.environ["ENABLE_AI_ANALYSIS"] = "false"
+
+
+def teardown_module(module):
+    import main
+
+    main.engine.dispose()
+    db_path = Path(main.engine.url.database)
+    for path in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        if path.exists():
+            path.unlink()
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main  # Import after env vars are set
+
+    # Another test module may have imported main against its own (now deleted) database file.
+    main.engine.dispose()
+    main.Base.metadata.create_all(bind=main.engine)
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="module")
+def dev_token(client: TestClient):
+    import main
+
+    resp = client.post(
+        "/auth/login",
+        json={"username": main.DEMO_DEVELOPER_EMAIL, "password": main.DEMO_DEVELOPER_PASSWORD},
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()["access_token"]
+
+
+def auth_header(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_request(client: TestClient, token: str, attachments=None, title="Dev Task"):
+    me = client.get("/users/me", headers=auth_header(token)).json()
+    payload = {
+        "title": title,
+        "description": "Automate something",
+        "priority": "HIGH",
+        "projectName": "Tower",
+        "revitVersion": "2025",
+        "requesterId": me["id"],
+        "requesterName": me["name"],
+        "attachments": attachments or [],
+    }
+    resp = client.post("/requests", json=payload, headers=auth_header(token))
+    assert resp.status_code == 201, resp.text
+    return resp.json()
+
+
+def test_attachment_bytes_round_trip(client: TestClient, dev_token: str):
+    raw = b"\x89PNG\r\n\x1a\nnot-really-a-png"
+    data_url = "data:image/png;base64," + base64.b64encode(raw).decode()
+    created = create_request(
+        client, dev_token, attachments=[{"name": "shot.png", "type": "image/png", "data": data_url}]
+    )
+
+    detail = client.get(f"/requests/{created['id']}", headers=auth_header(dev_token))
+    assert detail.status_code == 200
+    attachment = detail.json()["attachments"][0]
+    assert attachment["data"] == data_url
+
+    raw_resp = client.get(f"/attachments/{attachment['id']}/raw", headers=auth_header(dev_token))
+    assert raw_resp.status_code == 200
+    assert raw_resp.content == raw
+    assert raw_resp.headers["content-type"] == "image/png"
+
+
+def test_buffered_download_fallback_and_unsafe_file_names(client: TestClient, dev_token: str, monkeypatch):
+    import main
+
+    raw = bytes(range(256)) * 600  # spans several download chunks
+    name = 'plan "v2" – Zürich.bin'
+    data_url = "data:application/octet-stream;base64," + base64.b64encode(raw).decode()
+    created = create_request(
+        client, dev_token, attachments=[{"name": name, "type": "application/octet-stream", "data": data_url}]
+    )
+    attachment_id = client.get(f"/requests/{created['id']}", headers=auth_header(dev_token)).json()["attachments"][0]["id"]
+
+    # The path taken on databases without incremental BLOB I/O
+    monkeypatch.setattr(main, "SQLITE_BLOB_STREAMING", False)
+    resp = client.get(f"/attachments/{attachment_id}/raw", headers=auth_header(dev_token))
+    assert resp.status_code == 200
+    assert resp.content == raw
+    assert resp.headers["content-length"] == str(len(raw))
+    assert resp.headers["content-disposition"] == (
+        'attachment; filename="plan _v2_ _ Z_rich.bin"; '
+        "filename*=UTF-8''plan%20%22v2%22%20%E2%80%93%20Z%C3%BCrich.bin"
+    )
+
+
+def test_malformed_file_data_is_rejected(client: TestClient, dev_token: str):
+    created = create_request(client, dev_token, title="Bad Upload")
+    files = [{"name": "broken.py", "type": "text/x-python", "data": "data:text/x-python;base64,abc"}]
+    resp = client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    assert resp.status_code == 400
+    detail = client.get(f"/requests/{created['id']}", headers=auth_header(dev_token)).json()
+    assert detail["resultFiles"] == []
+
+
+def collect_nodes(nodes):
+    for node in nodes:
+        yield node
+        yield from collect_nodes(node["children"])
+
+
+def test_request_listing_can_leave_out_file_payloads(client: TestClient, dev_token: str):
+    attachments = [{"name": "plan.txt", "type": "text/plain", "data": "data:text/plain;base64,cGxhbg=="}]
+    created = create_request(client, dev_token, attachments=attachments, title="Sheet Renamer")
+
+    listed = client.get("/requests", params={"includeData": "false"}, headers=auth_header(dev_token)).json()
+    item = next(r for r in listed if r["id"] == created["id"])
+    assert item["attachments"] == [{"id": item["attachments"][0]["id"], "name": "plan.txt", "type": "text/plain"}]
+
+    full = client.get("/requests", headers=auth_header(dev_token)).json()
+    assert next(r for r in full if r["id"] == created["id"])["attachments"][0]["data"] == attachments[0]["data"]
+
+
+def test_request_listing_pages_with_a_cursor(client: TestClient, dev_token: str):
+    created_ids = {create_request(client, dev_token, title=f"Paged {i}")["id"] for i in range(3)}
+    full = client.get("/requests", headers=auth_header(dev_token)).json()
+
+    paged, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = client.get("/requests", params=params, headers=auth_header(dev_token))
+        assert resp.status_code == 200
+        paged.extend(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [r["id"] for r in paged] == [r["id"] for r in full]
+    assert "X-Next-Cursor" not in client.get("/requests", params={"limit": len(full)}, headers=auth_header(dev_token)).headers
+    assert created_ids <= {r["id"] for r in paged}
+
+    resp = client.get("/requests", params={"cursor": "bogus"}, headers=auth_header(dev_token))
+    assert resp.status_code == 400
+
+
+def test_unchanged_listing_revalidates_with_etag(client: TestClient, dev_token: str):
+    created = create_request(client, dev_token, title="Etag Check")
+    first = client.get("/requests", headers=auth_header(dev_token))
+    etag = first.headers["ETag"]
+
+    unchanged = client.get("/requests", headers={**auth_header(dev_token), "If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+
+    resp = client.post(f"/requests/{created['id']}/comments", json={"content": "new"}, headers=auth_header(dev_token))
+    assert resp.status_code == 201
+    changed = client.get("/requests", headers={**auth_header(dev_token), "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_script_tree_sync_is_idempotent(client: TestClient, dev_token: str):
+    created = create_request(client, dev_token, title="Sheet Renamer")
+    files = [
+        {"name": "renamer.py", "type": "text/x-python", "data": "data:text/x-python;base64,cHJpbnQoMSk="},
+        {"name": "README.md", "type": "text/markdown", "data": "data:text/markdown;base64,IyBoaQ=="},
+    ]
+    resp = client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    assert resp.status_code == 200
+    resp = client.put(f"/requests/{created['id']}", json={"status": "COMPLETED"}, headers=auth_header(dev_token))
+    assert resp.status_code == 200
+
+    for _ in range(2):
+        tree = client.get("/script-tree", headers=auth_header(dev_token))
+        assert tree.status_code == 200
+        nodes = list(collect_nodes(tree.json()))
+        folders = [n for n in nodes if n["type"] == "FOLDER" and n["requestId"] == created["id"]]
+        assert len(folders) == 1
+        file_names = sorted(n["name"] for n in folders[0]["children"])
+        assert file_names == ["README.md", "renamer.py"]
+
+
+def test_legacy_bcrypt_hash_is_upgraded_on_login(client: TestClient):
+    import main
+    from passlib.context import CryptContext
+
+    legacy_hash = CryptContext(schemes=["bcrypt"]).hash("LegacyPass1")
+    db = main.SessionLocal()
+    try:
+        db.add(main.User(name="Legacy User", email="legacy@example.com", password=legacy_hash, role=main.EMPLOYEE_ROLE))
+        db.commit()
+    finally:
+        db.close()
+
+    resp = client.post("/auth/login", json={"username": "legacy@example.com", "password": "LegacyPass1"})
+    assert resp.status_code == 200, resp.text
+
+    db = main.SessionLocal()
+    try:
+        user = db.query(main.User).filter(main.User.email == "legacy@example.com").first()
+        assert user.password.startswith("$argon2id$")
+    finally:
+        db.close()
+
+
+def test_schema_migration_tolerates_case_only_duplicate_emails(client: TestClient):
+    import main
+
+    def email_index_exists():
+        with main.engine.connect() as conn:
+            return conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_users_email_lower'"
+            ).first() is not None
+
+    # A database from before the lower(email) index could hold accounts that differ only by case
+    with main.engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ux_users_email_lower")
+        for email in ("Bob@x.com", "bob@x.com"):
+            conn.exec_driver_sql(
+                "INSERT INTO users (name, email, password, role) VALUES ('Bob', ?, 'x', ?)", (email, main.EMPLOYEE_ROLE)
+            )
+
+    assert main.ensure_schema() is False
+    assert not email_index_exists()
+
+    with main.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM users WHERE email = 'Bob@x.com'")
+    assert main.ensure_schema() is True
+    assert email_index_exists()
+    with main.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM users WHERE email = 'bob@x.com'")
+
+
+def test_role_changes_apply_to_cached_sessions(client: TestClient, dev_token: str):
+    resp = client.post(
+        "/users",
+        json={
+            "name": "Bob Employee",
+            "email": "bob@example.com",
+            "password": "StrongPass1",
+            "role": "EMPLOYEE",
+            "companyTitle": "Engineer",
+        },
+        headers=auth_header(dev_token),
+    )
+    assert resp.status_code == 201, resp.text
+    bob = resp.json()
+    login = client.post("/auth/login", json={"username": "bob@example.com", "password": "StrongPass1"})
+    bob_token = login.json()["access_token"]
+
+    assert client.get("/users", headers=auth_header(bob_token)).status_code == 403
+    assert client.post(f"/users/{bob['id']}/promote", headers=auth_header(dev_token)).status_code == 200
+    assert client.get("/users", headers=auth_header(bob_token)).status_code == 200
+
+    assert client.delete(f"/users/{bob['id']}", headers=auth_header(dev_token)).status_code == 204
+    assert client.get("/users/me", headers=auth_header(bob_token)).status_code == 401
+
+
+def test_duplicate_creates_are_rejected(client: TestClient, dev_token: str):
+    user = {
+        "name": "Dana Employee",
+        "email": "dana@example.com",
+        "password": "StrongPass1",
+        "role": "EMPLOYEE",
+        "companyTitle": "Engineer",
+    }
+    assert client.post("/users", json=user, headers=auth_header(dev_token)).status_code == 201
+    dup = client.post("/users", json={**user, "email": "DANA@example.com"}, headers=auth_header(dev_token))
+    assert dup.status_code == 400
+    assert dup.json()["detail"] == "Email already registered"
+
+    signup = {"name": "Eve Applicant", "email": "eve@example.com", "password": "StrongPass1", "companyTitle": "Designer"}
+    assert client.post("/auth/register", json=signup).status_code == 201
+    again = client.post("/auth/register", json=signup)
+    assert again.status_code == 400
+    assert again.json()["detail"] == "Registration request already pending"
+
+    registrations = client.get("/registration-requests", headers=auth_header(dev_token)).json()
+    pending = next(r for r in registrations if r["email"] == "eve@example.com")
+    approved = client.post(f"/registration-requests/{pending['id']}/approve", headers=auth_header(dev_token))
+    assert approved.status_code == 200, approved.text
+    assert approved.json()["email"] == "eve@example.com"
+    assert client.post(f"/registration-requests/{pending['id']}/approve", headers=auth_header(dev_token)).status_code == 400
+
+
+def test_submission_count_tracks_result_file_uploads(client: TestClient, dev_token: str):
+    created = create_request(client, dev_token, title="Door Tagger")
+    files = [{"name": "tagger.py", "type": "text/x-python", "data": "data:text/x-python;base64,cHJpbnQoMSk="}]
+    first = client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    second = client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    assert first.json()["eventType"] == "SUBMISSION"
+    assert second.json()["eventType"] == "RESUBMISSION"
+
+    detail = client.get(f"/requests/{created['id']}", headers=auth_header(dev_token)).json()
+    assert detail["submissionCount"] == 2
+    assert [e["eventType"] for e in detail["submissionEvents"]] == ["SUBMISSION", "RESUBMISSION"]
+
+    listed = client.get("/requests", headers=auth_header(dev_token)).json()
+    item = next(r for r in listed if r["id"] == created["id"])
+    assert item["submissionCount"] == 2
+    assert "submissionEvents" not in item
+
+    raw = client.get(f"/result-files/{item['resultFiles'][0]['id']}/raw", headers=auth_header(dev_token))
+    assert raw.status_code == 200
+    assert raw.content == b"print(1)"
+
+    first_id, second_id = (rf["id"] for rf in item["resultFiles"])
+    removed = client.delete(f"/requests/{created['id']}/result-files/{first_id}", headers=auth_header(dev_token))
+    assert removed.status_code == 204
+    remaining = client.get(f"/requests/{created['id']}", headers=auth_header(dev_token)).json()["resultFiles"]
+    assert [rf["id"] for rf in remaining] == [second_id]
+
+
+def test_script_tree_reflects_changes_below_cached_nodes(client: TestClient, dev_token: str):
+    import main
+
+    created = create_request(client, dev_token, title="Level Checker")
+    files = [{"name": "levels.py", "type": "text/x-python", "data": "data:text/x-python;base64,cHJpbnQoMSk="}]
+    client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    client.put(f"/requests/{created['id']}", json={"status": "COMPLETED"}, headers=auth_header(dev_token))
+
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    folder = next(n for n in collect_nodes(tree) if n["type"] == "FOLDER" and n["requestId"] == created["id"])
+
+    resp = client.post(
+        "/script-tree/folder", json={"name": "Nested", "parentId": folder["id"]}, headers=auth_header(dev_token)
+    )
+    assert resp.status_code == 201
+    client.post(f"/requests/{created['id']}/comments", json={"content": "Looks good"}, headers=auth_header(dev_token))
+
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    folder = next(n for n in collect_nodes(tree) if n["type"] == "FOLDER" and n["requestId"] == created["id"])
+    assert "Nested" in [child["name"] for child in folder["children"]]
+    assert [c["content"] for c in folder["request"]["comments"]] == ["Looks good"]
+
+    # A profile change touches only the users row, not the request
+    db = main.SessionLocal()
+    try:
+        requester = db.get(main.User, created["requesterId"])
+        original_name, requester.name = requester.name, "Renamed Developer"
+        db.commit()
+        tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+        folder = next(n for n in collect_nodes(tree) if n["type"] == "FOLDER" and n["requestId"] == created["id"])
+        assert folder["request"]["requester"]["name"] == "Renamed Developer"
+        requester.name = original_name
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_export_streams_zip_and_stores_compressed_files(client: TestClient, dev_token: str):
+    import io
+    import zipfile
+
+    created = create_request(client, dev_token, title="Bundle Export")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as inner:
+        inner.writestr("tool.py", "print(1)")
+    files = [
+        {"name": "bundle.zip", "type": "application/zip",
+         "data": "data:application/zip;base64," + base64.b64encode(archive.getvalue()).decode()},
+        {"name": "tool.py", "type": "text/x-python", "data": "data:text/x-python;base64,cHJpbnQoMSk="},
+    ]
+    client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    client.put(f"/requests/{created['id']}", json={"status": "COMPLETED"}, headers=auth_header(dev_token))
+
+    resp = client.get("/script-tree/export", headers=auth_header(dev_token))
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert zf.testzip() is None
+        infos = {info.filename.rsplit("/", 1)[-1]: info for info in zf.infolist()}
+        assert zf.read(infos["bundle.zip"]) == archive.getvalue()
+        assert infos["bundle.zip"].compress_type == zipfile.ZIP_STORED
+        assert infos["tool.py"].compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_deleted_unsorted_folder_is_recreated(client: TestClient, dev_token: str):
+    import main
+
+    created = create_request(client, dev_token, title="Grid Aligner")
+    files = [{"name": "grids.py", "type": "text/x-python", "data": "data:text/x-python;base64,cHJpbnQoMSk="}]
+    client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    client.put(f"/requests/{created['id']}", json={"status": "COMPLETED"}, headers=auth_header(dev_token))
+
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    unsorted = next(n for n in tree[0]["children"] if n["name"] == "Unsorted")
+    resp = client.delete(f"/script-tree/{unsorted['id']}", headers=auth_header(dev_token))
+    assert resp.status_code == 204
+
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    recreated = next(n for n in tree[0]["children"] if n["name"] == "Unsorted")
+    assert created["id"] in [child["requestId"] for child in recreated["children"]]
+
+    # Another worker deletes the folder, leaving this process's folder cache warm
+    with main.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "WITH RECURSIVE subtree(id) AS (SELECT ? UNION ALL "
+            "SELECT script_nodes.id FROM script_nodes JOIN subtree ON script_nodes.parent_id = subtree.id) "
+            "DELETE FROM script_nodes WHERE id IN subtree",
+            (recreated["id"],),
+        )
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    recreated = next(n for n in tree[0]["children"] if n["name"] == "Unsorted")
+    assert created["id"] in [child["requestId"] for child in recreated["children"]]
+
+
+def test_deleting_user_removes_their_requests_and_script_nodes(client: TestClient, dev_token: str):
+    import main
+
+    resp = client.post(
+        "/users",
+        json={
+            "name": "Carol Employee",
+            "email": "carol@example.com",
+            "password": "StrongPass1",
+            "role": "EMPLOYEE",
+            "companyTitle": "Engineer",
+        },
+        headers=auth_header(dev_token),
+    )
+    assert resp.status_code == 201, resp.text
+    carol = resp.json()
+    carol_token = client.post(
+        "/auth/login", json={"username": "carol@example.com", "password": "StrongPass1"}
+    ).json()["access_token"]
+    created = create_request(
+        client, carol_token, title="Carol Task",
+        attachments=[{"name": "spec.txt", "type": "text/plain", "data": "data:text/plain;base64,aGk="}],
+    )
+    files = [{"name": "carol.py", "type": "text/x-python", "data": "data:text/x-python;base64,cHJpbnQoMSk="}]
+    client.post(f"/requests/{created['id']}/result-files", json=files, headers=auth_header(dev_token))
+    client.put(f"/requests/{created['id']}", json={"status": "COMPLETED"}, headers=auth_header(dev_token))
+    client.post(f"/requests/{created['id']}/comments", json={"content": "Done"}, headers=auth_header(dev_token))
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    folder = next(n for n in collect_nodes(tree) if n["type"] == "FOLDER" and n["requestId"] == created["id"])
+    client.post("/script-tree/folder", json={"name": "Extras", "parentId": folder["id"]}, headers=auth_header(dev_token))
+
+    assert client.delete(f"/users/{carol['id']}", headers=auth_header(dev_token)).status_code == 204
+
+    assert client.get(f"/requests/{created['id']}", headers=auth_header(dev_token)).status_code == 404
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    assert not [n for n in collect_nodes(tree) if n["requestId"] == created["id"] or n["name"] == "Extras"]
+    db = main.SessionLocal()
+    try:
+        for model in (main.Attachment, main.ResultFile, main.SubmissionEvent, main.Comment):
+            assert db.query(model).filter(model.request_id == created["id"]).count() == 0
+    finally:
+        db.close()
+
+
+def test_folder_moves_and_deletes_cover_the_whole_subtree(client: TestClient, dev_token: str):
+    outer = client.post("/script-tree/folder", json={"name": "Outer"}, headers=auth_header(dev_token)).json()
+    middle = client.post(
+        "/script-tree/folder", json={"name": "Middle", "parentId": outer["id"]}, headers=auth_header(dev_token)
+    ).json()
+    inner = client.post(
+        "/script-tree/folder", json={"name": "Inner", "parentId": middle["id"]}, headers=auth_header(dev_token)
+    ).json()
+
+    resp = client.put(f"/script-tree/{outer['id']}", json={"parentId": inner["id"]}, headers=auth_header(dev_token))
+    assert resp.status_code == 400
+    resp = client.put(f"/script-tree/{inner['id']}", json={"parentId": outer["id"]}, headers=auth_header(dev_token))
+    assert resp.status_code == 200
+    assert resp.json()["parentId"] == outer["id"]
+
+    assert client.delete(f"/script-tree/{outer['id']}", headers=auth_header(dev_token)).status_code == 204
+    tree = client.get("/script-tree", headers=auth_header(dev_token)).json()
+    assert not {"Outer", "Middle", "Inner"} & {n["name"] for n in collect_nodes(tree)}
+
+
+def test_full_email_queue_is_reported_to_the_caller(client: TestClient, dev_token: str, monkeypatch):
+    import asyncio
+    import main
+
+    full_queue = asyncio.Queue(maxsize=1)
+    full_queue.put_nowait(object())
+    monkeypatch.setattr(main, "SMTP_USER", "mailer@example.com")
+    monkeypatch.setattr(main, "SMTP_PASSWORD", "secret")
+    monkeypatch.setattr(main, "email_queue", full_queue)
+
+    resp = client.post(
+        "/notifications/email",
+        json={"to": "someone@example.com", "subject": "Hi", "body": "<p>Hello</p>"},
+        headers=auth_header(dev_token),
+    )
+    assert resp.status_code == 503
+    assert full_queue.qsize() == 1